@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from src.manning_main import setup_simulation
+from src.rate_cache import RateCache
 import plotly.graph_objects as go
 
 PATH = 'outputs/simulation_results.parquet'
@@ -212,8 +213,10 @@ if st.sidebar.button("Run Simulation"):
         # Define range to test
         test_range = list(range(100, 351, 25)) 
         stability_data = []
+        # One prediction cache for every intake level: later runs mostly hit it
+        rate_cache = RateCache()
 
-        base_sim, base_squadrons = setup_simulation(sim_upgrades=include_upgrades)
+        base_sim, base_squadrons = setup_simulation(sim_upgrades=include_upgrades, rate_cache=rate_cache)
 
         # Loop with enumeration to update the bar
         for i, val in enumerate(test_range):
@@ -221,7 +224,7 @@ if st.sidebar.button("Run Simulation"):
             pct_complete = (i + 1) / len(test_range)
             sensitivity_progress.progress(pct_complete, text=f"Simulating Intake: {val} pilots/yr...")
 
-            t_sim, t_sqs = setup_simulation(sim_upgrades=include_upgrades)
+            t_sim, t_sqs = setup_simulation(sim_upgrades=include_upgrades, rate_cache=rate_cache)
 
             t_df = t_sim.run_simulation(
                 years_to_run=20, 
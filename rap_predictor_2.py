@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
 import joblib  # Used to save the "Brain" to a file
+from src.rate_cache import BRAIN_VERSION
 
 # 1. LOAD DATA
 path = "outputs/simulation_results.parquet"
@@ -13,29 +15,61 @@ features = ['paa', 'ute', 'exp_ratio', 'total_pilots', 'mqt_qty', 'flug_qty', 'i
 for col in features:
     if col not in df.columns: df[col] = 0
 
-# 2. TRAIN 3 SEPARATE MODELS
+# 2. TRAIN THE MODELS
 targets = ['wg_monthly', 'fl_monthly', 'ip_monthly', 'wg_blue_monthly', 'fl_blue_monthly', 'ip_blue_monthly']
-models = {}
+# True: one forest learns all six targets (brain version BRAIN_VERSION).
+# False: the original six separate forests.
+MULTI_OUTPUT = True
+# The single forest needs one row set, so it trains on the rows clean for every
+# target. If those are fewer than this share of the rows some target keeps, the
+# joint filter would cost the other targets too much data: train the separate
+# forests (brain version 1) instead.
+MIN_JOINT_SHARE = 0.9
 
 print("🧠 Training Neural Models (Random Forest)...")
-for target in targets:
-    print(f"   - Learning physics for {target}...")
-    
+clean = df[targets] > 0.1
+joint = clean.all(axis=1)
+if MULTI_OUTPUT and (not joint.any() or joint.sum() < MIN_JOINT_SHARE * clean.any(axis=1).sum()):
+    print(f"   ⚠️ Only {joint.sum()} of {clean.any(axis=1).sum()} rows are clean for every target; "
+          f"training separate forests instead.")
+    MULTI_OUTPUT = False
+
+if MULTI_OUTPUT:
+    print(f"   - Learning physics for all {len(targets)} targets...")
+
     # Filter out garbage (Optional: keeps the training clean)
-    clean_df = df[df[target] > 0.1]
-    
-    X = clean_df[features]
-    y = clean_df[target]
-    
+    X = df.loc[joint, features]
+    y = df.loc[joint, targets]
+
     # Higher estimators = smoother curves in your app
     model = RandomForestRegressor(n_estimators=100, max_depth=15, random_state=42)
     model.fit(X, y)
-    
-    models[target] = model
-    print(f"     Score: {model.score(X, y):.4f}")
+
+    pred = model.predict(X)
+    for k, target in enumerate(targets):
+        print(f"     {target} Score: {r2_score(y[target], pred[:, k]):.4f}")
+    brain = {"version": BRAIN_VERSION, "features": features, "targets": targets, "model": model}
+else:
+    models = {}
+    for target in targets:
+        print(f"   - Learning physics for {target}...")
+        
+        # Filter out garbage (Optional: keeps the training clean)
+        clean_df = df[df[target] > 0.1]
+        
+        X = clean_df[features]
+        y = clean_df[target]
+        
+        # Higher estimators = smoother curves in your app
+        model = RandomForestRegressor(n_estimators=100, max_depth=15, random_state=42)
+        model.fit(X, y)
+        
+        models[target] = model
+        print(f"     Score: {model.score(X, y):.4f}")
+    brain = models
 
 # 3. SAVE THE BRAIN
 filename = "sortie_brain.pkl"
-joblib.dump(models, filename)
+joblib.dump(brain, filename)
 print(f"\n✅ Brain saved to {filename}")
 print("   Move this file to your Streamlit app folder.")
\ No newline at end of file
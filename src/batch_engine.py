@@ -0,0 +1,252 @@
+import time
+from typing import Sequence, Dict, Optional
+import numpy as np
+from src.models import SquadronConfig
+from src.syllabi import CONTINUATION_PROFILE
+from src.rap_state import RAP_REQUIREMENTS
+from src.vector_engine import WG, FL, IP, NONE, MQT, FLUG, IPUG, QUAL_CODES, PROGRAM_EVENTS
+from src.engine import add_stage_time
+from src import kernels
+
+# ----------------------
+# Output Layout
+# ----------------------
+GROUPS = ("mqt", "wg", "fl", "ip")
+
+BATCH_DTYPE = np.dtype(
+    [("feasible", np.bool_)]
+    + [(f"{g}_{stat}", np.float64) for g in GROUPS for stat in ("monthly", "blue_monthly", "red_monthly", "red_pct")]
+    + [("rap_state_code", np.int8), ("blue_rap_state_code", np.int8)]
+)
+
+# ----------------------
+# 2-D Water-Filling
+# ----------------------
+def water_fill_2d(levels: np.ndarray, pool: np.ndarray, qty: np.ndarray, tie_break: str = "list") -> np.ndarray:
+    """
+    Row-wise engine.water_fill: levels is (configs, pilots), pool masks the pilots
+    each row may use and qty is the per-row sortie count. Returns the increments.
+    """
+    rows, width = levels.shape
+    qty = np.asarray(qty, dtype=np.int64)
+    big = np.iinfo(np.int64).max // 4
+
+    masked = np.where(pool, levels, big)
+    s = np.sort(masked, axis=1)
+    s_valid = np.where(s < big, s, 0)
+    prefix = np.cumsum(s_valid, axis=1)
+    cost = s_valid * np.arange(1, width + 1) - prefix
+    cost = np.where(s < big, cost, big)
+
+    k = (cost <= qty[:, None]).sum(axis=1)
+    has_pool = (k > 0) & (qty > 0)
+    k_safe = np.maximum(k, 1)
+    top = prefix[np.arange(rows), k_safe - 1]
+    level = np.where(has_pool, (qty + top) // k_safe, 0)
+    remainder = np.where(has_pool, qty + top - level * k_safe, 0)
+
+    active = pool & has_pool[:, None] & (levels <= level[:, None])
+    inc = np.where(active, level[:, None] - levels, 0)
+
+    if tie_break == "list":
+        rank = np.cumsum(active, axis=1) - 1
+    elif tie_break == "recent":
+        rank = _recent_rank(levels, active, level)
+    else:
+        raise ValueError(f"Unknown tie_break '{tie_break}'")
+
+    inc += active & (rank < remainder[:, None])
+    return inc
+
+def _recent_rank(levels: np.ndarray, active: np.ndarray, level: np.ndarray) -> np.ndarray:
+    # Closed form of engine._recent_order: a level started an odd number of levels
+    # above the lowest one was appended while the queue was reversed, so it sits at
+    # the head, newest first and internally reversed; the final view is reversed if
+    # the fill climbed an odd number of levels in total.
+    width = levels.shape[1]
+    pos = np.arange(width)
+    base = np.where(active, levels, np.iinfo(np.int64).max).min(axis=1, keepdims=True)
+    odd = (levels - base) % 2 == 1
+
+    key = np.where(odd, -(levels * (width + 1) + pos) - 1, levels * (width + 1) + pos)
+    key = np.where(((level[:, None] - base) % 2) == 1, -key, key)
+    key = np.where(active, key, np.iinfo(np.int64).max)
+    return np.argsort(np.argsort(key, axis=1, kind="stable"), axis=1, kind="stable")
+
+# ----------------------
+# Batch State
+# ----------------------
+class _Batch:
+    def __init__(self, configs: Sequence[SquadronConfig]):
+        self.ute = np.array([c.ute for c in configs], dtype=np.float64)
+        self.paa = np.array([c.paa for c in configs], dtype=np.float64)
+        self.days = np.array([c.phase_length_days for c in configs], dtype=np.float64)
+        total = np.array([c.total_pilots for c in configs], dtype=np.int64)
+        exp = np.array([c.experience_ratio for c in configs], dtype=np.float64)
+        ip = np.array([c.ip_qty for c in configs], dtype=np.int64)
+        mqt = np.array([c.mqt_students for c in configs], dtype=np.int64)
+        flug = np.array([c.flug_students for c in configs], dtype=np.int64)
+        ipug = np.array([c.ipug_students for c in configs], dtype=np.int64)
+
+        # Same checks as engine.pilot_counts, as a mask instead of ValueError
+        experienced = np.floor(total * exp).astype(np.int64)
+        fl = experienced - ip
+        wg = total - experienced
+        self.feasible = (experienced <= total) & (ip <= experienced) & (mqt + flug <= wg)
+
+        rows = len(configs)
+        width = int(total[self.feasible].max()) if self.feasible.any() else 0
+        slot = np.arange(width)[None, :]
+        total = np.where(self.feasible, total, 0)[:, None]
+        wg, fl = wg[:, None], fl[:, None]
+
+        self.valid = slot < total
+        self.qual = np.where(slot < wg, WG, np.where(slot < wg + fl, FL, IP)).astype(np.int8)
+
+        # create_pilots order + select_upgrade_students: first eligible pilots win
+        self.upgrade = np.full((rows, width), NONE, dtype=np.int8)
+        self.upgrade[self.valid & (slot < mqt[:, None])] = MQT
+        self.upgrade[self.valid & (slot >= mqt[:, None]) & (slot < (mqt + flug)[:, None])] = FLUG
+        self.upgrade[self.valid & (slot >= wg) & (slot < wg + np.minimum(ipug[:, None], fl))] = IPUG
+
+        self.sortie = np.zeros((rows, width), dtype=np.int64)
+        self.blue = np.zeros((rows, width), dtype=np.int64)
+        self.red = np.zeros((rows, width), dtype=np.int64)
+
+    def seat_pool(self, seat_code: int, syllabus_code=None) -> np.ndarray:
+        # Row-wise vector_engine.can_fill_seat_mask
+        mask = self.valid & (self.qual >= seat_code)
+        if syllabus_code != MQT:
+            mask &= self.upgrade != MQT
+        if syllabus_code not in (FLUG, None):
+            mask &= self.upgrade != FLUG
+        if syllabus_code not in (IPUG, None):
+            mask &= self.upgrade != IPUG
+        return mask
+
+    def fill(self, pool: np.ndarray, qty: np.ndarray, is_red: bool, tie_break: str):
+        inc = water_fill_2d(self.sortie, pool, qty, tie_break)
+        self.sortie += inc
+        if is_red:
+            self.red += inc
+        else:
+            self.blue += inc
+
+# ----------------------
+# Phase Steps
+# ----------------------
+def _run_upgrade_programs(batch: _Batch, count_sims: bool):
+    # Seat by seat per row (kernels.program_rows_kernel), so every row matches
+    # engine.run_upgrade_program exactly, student exclusion included. Sim counts
+    # are not reported, so with count_sims the SIM events are simply skipped.
+    for code in (MQT, FLUG, IPUG):
+        events, is_sim = PROGRAM_EVENTS[code]
+        if count_sims:
+            events = events[~is_sim]
+        students = batch.upgrade == code
+        if not students.any():
+            continue
+        kernels.program_rows_kernel(
+            batch.sortie, batch.blue, batch.red, students,
+            batch.seat_pool(IP, code), batch.seat_pool(FL, code), batch.seat_pool(WG, code), events,
+        )
+
+def _allocate_continuation_training(batch: _Batch):
+    months = batch.days / 30.0
+    capacity = np.floor(batch.ute * batch.paa * months).astype(np.int64)
+    remaining = np.maximum(0, capacity - batch.sortie.sum(axis=1))
+    remaining = np.where(batch.feasible, remaining, 0)
+
+    # Row-wise engine.continuation_bucket_quantities
+    buckets = CONTINUATION_PROFILE.buckets
+    fractions = np.array([b.fraction for b in buckets])
+    raw = remaining[:, None] * fractions[None, :]
+    base = np.floor(raw).astype(np.int64)
+    leftover = remaining - base.sum(axis=1)
+    order_rank = np.argsort(np.argsort(-(raw - base), axis=1, kind="stable"), axis=1, kind="stable")
+    base += leftover[:, None] // len(buckets) + (order_rank < (leftover % len(buckets))[:, None])
+
+    ct_candidates = batch.valid & (batch.upgrade != MQT)
+    for j, bucket in enumerate(buckets):
+        pool = ct_candidates & (batch.qual >= QUAL_CODES[bucket.min_qual])
+        batch.fill(pool, base[:, j], bucket.side == "Red", "recent")
+
+def _pilot_order_sum(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # Row sums accumulated left to right, like rap_assess's sum() over pilots, so a
+    # rate landing exactly on a RAP requirement rounds the same way (np.sum is pairwise)
+    if values.shape[1] == 0:
+        return np.zeros(len(values))
+    return np.cumsum(np.where(mask, values, 0.0), axis=1)[:, -1]
+
+def _group_stats(batch: _Batch) -> np.ndarray:
+    rows = len(batch.feasible)
+    out = np.zeros(rows, dtype=BATCH_DTYPE)
+    out["feasible"] = batch.feasible
+    months = (batch.days / 30.0)[:, None]
+    safe_months = np.where(months > 0, months, 1.0)
+
+    groups = {
+        "mqt": batch.valid & (batch.upgrade == MQT),
+        "wg": batch.valid & (batch.qual == WG) & (batch.upgrade != MQT),
+        "fl": batch.valid & (batch.qual == FL),
+        "ip": batch.valid & (batch.qual == IP),
+    }
+
+    rap_code = np.zeros(rows, dtype=np.int8)
+    blue_code = np.zeros(rows, dtype=np.int8)
+    for g, mask in groups.items():
+        size = mask.sum(axis=1)
+        safe_size = np.maximum(size, 1)
+        avg = _pilot_order_sum(batch.sortie / safe_months, mask) / safe_size
+        avg_blue = _pilot_order_sum(batch.blue / safe_months, mask) / safe_size
+        avg_red = _pilot_order_sum(batch.red / safe_months, mask) / safe_size
+
+        out[f"{g}_monthly"] = avg
+        out[f"{g}_blue_monthly"] = avg_blue
+        out[f"{g}_red_monthly"] = avg_red
+        out[f"{g}_red_pct"] = np.where(avg > 0, avg_red / np.where(avg > 0, avg, 1), 0)
+
+        rap_req, bit_mask = RAP_REQUIREMENTS[g.upper()]
+        if g != "mqt":
+            rap_code += np.where((size > 0) & (avg < rap_req), bit_mask, 0).astype(np.int8)
+            blue_code += np.where((size > 0) & (avg_blue < rap_req), bit_mask, 0).astype(np.int8)
+
+    out["rap_state_code"] = rap_code
+    out["blue_rap_state_code"] = blue_code
+
+    for name in out.dtype.names:
+        if name != "feasible" and out.dtype[name].kind == "f":
+            out[name][~batch.feasible] = np.nan
+    return out
+
+# ----------------------
+# Public API
+# ----------------------
+def run_phase_batch(configs: Sequence[SquadronConfig], timings: Optional[Dict[str, float]] = None,
+                    count_sims: bool = False) -> np.ndarray:
+    """
+    Simulates one phase for many squadron configs at once (zero allocation noise).
+
+    Squadrons are padded to a common pilot count and run as (configs x pilots)
+    arrays: syllabi seat by seat per row in the allocation kernel, CT water-filled
+    row-wise, so each row matches engine.run_phase_simulation (with the same
+    count_sims) exactly. Returns a BATCH_DTYPE structured array with one row per
+    config: per-group monthly/blue/red rates and RAP state codes. Configs that
+    create_pilots would reject have feasible=False and NaN rates.
+
+    timings: optional dict that seconds per stage ("pilot_creation", "syllabus",
+    "ct", "rap_assess") are added to.
+    """
+    if len(configs) == 0:
+        return np.zeros(0, dtype=BATCH_DTYPE)
+
+    start = time.perf_counter()
+    batch = _Batch(configs)
+    start = add_stage_time(timings, "pilot_creation", start)
+    _run_upgrade_programs(batch, count_sims)
+    start = add_stage_time(timings, "syllabus", start)
+    _allocate_continuation_training(batch)
+    start = add_stage_time(timings, "ct", start)
+    stats = _group_stats(batch)
+    add_stage_time(timings, "rap_assess", start)
+    return stats
@@ -1,17 +1,35 @@
+import heapq
 import random
-from typing import List, Dict
-from src.models import SquadronConfig, Pilot, Qual, Upgrade
+import time
+from operator import attrgetter
+import numpy as np
+from typing import List, Dict, Optional
+from src.models import SquadronConfig, Pilot, Qual, Upgrade, EventType
 from src.syllabi import SyllabusEvent, ContinuationProfile, UpgradeProgram
 from src import rules
+from src import kernels
 # from src.syllabi import TEST_MQT_SYLLABUS, TEST_FLUG_SYLLABUS, TEST_IPUG_SYLLABUS, CONTINUATION_PROFILE
 from src.syllabi import MQT_SYLLABUS, FLUG_SYLLABUS, IPUG_SYLLABUS, CONTINUATION_PROFILE
 
+# ----------------------
+# Stage Timing
+# ----------------------
+def add_stage_time(timings: Optional[Dict[str, float]], stage: str, start: float) -> float:
+    """
+    Adds the time since start (a perf_counter value) to timings[stage] when
+    timings is given; returns the current perf_counter for the next stage.
+    """
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
 # ----------------------
 # Pilot Creation
 # ----------------------
-def create_pilots(cfg: SquadronConfig) -> List[Pilot]:
+def pilot_counts(cfg: SquadronConfig) -> tuple:
     """
-    Generates the initial list of pilots based on configuration.
+    Validates the configuration and returns the (WG, FL, IP) pilot counts.
     """
     experienced = int(cfg.total_pilots * cfg.experience_ratio)
 
@@ -27,7 +45,15 @@ def create_pilots(cfg: SquadronConfig) -> List[Pilot]:
 
     if cfg.mqt_students + cfg.flug_students > wg_count:
         raise ValueError ("WG upgrade quantity cannot exceed WG quantity")
-    
+
+    return wg_count, fl_count, ip_count
+
+def create_pilots(cfg: SquadronConfig) -> List[Pilot]:
+    """
+    Generates the initial list of pilots based on configuration.
+    """
+    wg_count, fl_count, ip_count = pilot_counts(cfg)
+
     return ([Pilot(Qual.WG) for _ in range(wg_count)] +
             [Pilot(Qual.FL) for _ in range(fl_count)] +
             [Pilot(Qual.IP) for _ in range(ip_count)])
@@ -56,106 +82,340 @@ def select_upgrade_students(pilots: List[Pilot], upgrade_type: Upgrade, count: i
 # ----------------------
 # Allocation Helpers
 # ----------------------
-def assign_sortie(candidates: List[Pilot], side: str = "Blue", noise: float = 0.0) -> bool:
+def credit_sortie(pilot: Pilot, side: str = "Blue", avg_sortie_dur: float = 0.0):
+    """
+    Credits one sortie on the given side to a pilot.
+    """
+    if hasattr(pilot, 'add_sortie'):
+        pilot.add_sortie(avg_sortie_dur, side)
+    else:
+        pilot.sortie_phase += 1
+        if side == "Blue":
+            pilot.sortie_blue_phase += 1
+        elif side == "Red":
+            pilot.sortie_red_phase += 1
+
+def credit_sim(pilot: Pilot):
+    """
+    Credits one simulator event to a pilot (sims have no side and use no aircraft).
+    """
+    pilot.sim_phase += 1
+
+def credit_sorties(pilot: Pilot, count: int, side: str = "Blue", avg_sortie_dur: float = 0.0):
+    """
+    Credits 'count' sorties on the given side at once (same effect as
+    calling credit_sortie 'count' times).
+    """
+    pilot.sortie_phase += count
+    if side == "Blue":
+        pilot.sortie_blue_phase += count
+    elif side == "Red":
+        pilot.sortie_red_phase += count
+
+    if hasattr(pilot, 'hours_phase'):
+        pilot.hours_phase += count * avg_sortie_dur
+
+def assign_sortie(candidates: List[Pilot], side: str = "Blue", noise: float = 0.0, avg_sortie_dur: float = 0.0) -> bool:
     """
     Selects the best candidate (lowest utilization) to fly a sortie.
     Returns True if a pilot was found and assigned, False otherwise.
+
+    Single-draw helper for one-off seats. Pools that hand out many sorties
+    should use a SortieAllocator instead.
     """
     if not candidates:
         return False
-    
-    # Sort by current monthly sorties + random noise for distribution
-    candidates.sort(key=lambda p: p.sortie_phase + random.uniform(0, noise))
-    
-    winner = candidates[0]
-    
-    # Use helper method if available in models.py, otherwise update manually
-    if hasattr(winner, 'add_sortie'):
-        winner.add_sortie(side)
+
+    # Lowest current sorties wins, ties go to the earliest candidate in the list.
+    # Zero noise skips the RNG entirely.
+    if noise > 0:
+        winner = min(candidates, key=lambda p: p.sortie_phase + random.uniform(0, noise))
     else:
-        winner.sortie_phase += 1
-        if side == "Blue":
-            winner.sortie_blue_phase += 1
-        elif side == "Red":
-            winner.sortie_red_phase += 1
-        
+        winner = min(candidates, key=lambda p: p.sortie_phase)
+
+    credit_sortie(winner, side, avg_sortie_dur)
     return True
 
+class SortieAllocator:
+    """
+    Priority queue over one seat pool that hands out the least-utilized pilot.
+
+    Pilots are keyed on sortie_phase (+ uniform noise drawn when queued), so each
+    draw costs O(log n) instead of a full sort. Entries whose pilot has flown
+    elsewhere since being queued are re-keyed lazily when they reach the top.
+    counter="sim_phase" keys and credits sims instead (see credit_sim).
+
+    tie_break controls the order among pilots with equal sorties:
+      "list"   -> position in the pool list (same as sorting a freshly built list)
+      "recent" -> the pilot served most recently goes first (same as re-sorting
+                  one list in place between draws, as CT allocation used to)
+    """
+    def __init__(self, pilots: List[Pilot], noise: float = 0.0, tie_break: str = "list", avg_sortie_dur: float = 0.0,
+                 counter: str = "sortie_phase"):
+        if tie_break not in ("list", "recent"):
+            raise ValueError(f"Unknown tie_break '{tie_break}'")
+        if counter not in ("sortie_phase", "sim_phase"):
+            raise ValueError(f"Unknown counter '{counter}'")
+
+        self.counter = counter
+        self._flown = attrgetter(counter)
+        self.noise = noise
+        self.tie_break = tie_break
+        self.avg_sortie_dur = avg_sortie_dur
+        self._served = 0
+
+        # Entries: (key, rank, sortie_phase when queued, list position, pilot)
+        self._heap = [self._entry(p, i, i) for i, p in enumerate(pilots)]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _entry(self, pilot: Pilot, rank: int, pos: int) -> tuple:
+        flown = self._flown(pilot)
+        key = flown + random.uniform(0, self.noise) if self.noise > 0 else flown
+        return (key, rank, flown, pos, pilot)
+
+    def _requeue(self, entry: tuple):
+        _, rank, _, pos, pilot = entry
+        if self.tie_break == "recent":
+            self._served += 1
+            rank = -self._served
+        heapq.heappush(self._heap, self._entry(pilot, rank, pos))
+
+    def _pop_current(self) -> tuple:
+        # Discard stale keys until the top entry reflects the pilot's real count
+        while True:
+            entry = heapq.heappop(self._heap)
+            if self._flown(entry[4]) == entry[2]:
+                return entry
+            heapq.heappush(self._heap, self._entry(entry[4], entry[1], entry[3]))
+
+    def assign(self, side: str = "Blue", exclude: Optional[Pilot] = None) -> Optional[Pilot]:
+        """
+        Credits a sortie to the least-utilized pilot in the pool (skipping
+        'exclude') and returns them, or None if nobody is available.
+        """
+        held = None
+        winner = None
+        while self._heap:
+            entry = self._pop_current()
+            if entry[4] is exclude:
+                held = entry
+                continue
+            winner = entry
+            break
+
+        if held is not None:
+            heapq.heappush(self._heap, held)
+
+        if winner is None:
+            return None
+
+        if self.counter == "sim_phase":
+            credit_sim(winner[4])
+        else:
+            credit_sortie(winner[4], side, self.avg_sortie_dur)
+        self._requeue(winner)
+        return winner[4]
+
+def water_fill(levels: np.ndarray, qty: int, tie_break: str = "list") -> np.ndarray:
+    """
+    Closed-form result of handing 'qty' sorties one at a time to the least-flown
+    pilot in a pool (zero noise). Returns the per-pilot increments.
+
+    The lowest levels are raised until the quantity runs out; the remainder goes
+    to the first pilots at the final level in SortieAllocator tie-break order:
+      "list"   -> pool position
+      "recent" -> each fully filled level is served back in reverse order, so the
+                  order at a level is the previous order reversed once per level
+                  climbed, followed by the pilots that started there
+    """
+    n = len(levels)
+    inc = np.zeros(n, dtype=np.int64)
+    if n == 0 or qty <= 0:
+        return inc
+
+    levels = np.asarray(levels, dtype=np.int64)
+    order = np.argsort(levels, kind="stable")
+    s = levels[order]
+    prefix = np.cumsum(s)
+
+    # Largest k whose first k pilots can all be raised to s[k-1]
+    cost = s * np.arange(1, n + 1) - prefix
+    k = int(np.searchsorted(cost, qty, side="right"))
+    level = (qty + prefix[k - 1]) // k
+    remainder = int(qty + prefix[k - 1] - level * k)
+
+    active = order[:k]
+    inc[active] = level - levels[active]
+
+    if remainder:
+        if tie_break == "list":
+            first = np.sort(active)[:remainder]
+        elif tie_break == "recent":
+            first = _recent_order(levels, s[:k], level)[:remainder]
+        else:
+            raise ValueError(f"Unknown tie_break '{tie_break}'")
+        inc[first] += 1
+
+    return inc
+
+def _recent_order(levels: np.ndarray, active_levels: np.ndarray, level: int) -> np.ndarray:
+    queue = np.empty(0, dtype=np.int64)
+    prev = None
+    for value in np.unique(active_levels):
+        if prev is not None and (value - prev) % 2:
+            queue = queue[::-1]
+        queue = np.concatenate([queue, np.flatnonzero(levels == value)])
+        prev = value
+
+    if (level - prev) % 2:
+        queue = queue[::-1]
+    return queue
+
 # ----------------------
 # Syllabus Execution
 # ----------------------
+class SeatPools:
+    """
+    Eligible pilot pools for one syllabus run, indexed by (seat qual, syllabus upgrade).
+
+    Each pool is a SortieAllocator built once from rules.can_fill_seat, so seats
+    draw from it in O(log n) instead of re-filtering every pilot. Counts that change
+    in another pool are picked up lazily by the allocator; call refresh() when a
+    pilot's qual or upgrade changes so the pools are rebuilt. counter is passed to
+    every SortieAllocator ("sim_phase" pools hand out sims).
+    """
+    def __init__(self, pilots: List[Pilot], noise: float = 0.0, avg_sortie_dur: float = 0.0, counter: str = "sortie_phase"):
+        self.pilots = pilots
+        self.noise = noise
+        self.avg_sortie_dur = avg_sortie_dur
+        self.counter = counter
+        self._pools: Dict[tuple, SortieAllocator] = {}
+
+    def get(self, seat_type: Qual, syllabus_upgrade: Upgrade) -> SortieAllocator:
+        key = (seat_type, syllabus_upgrade)
+        if key not in self._pools:
+            eligible = [p for p in self.pilots if rules.can_fill_seat(p, seat_type, syllabus_upgrade)]
+            self._pools[key] = SortieAllocator(eligible, self.noise, tie_break="list", avg_sortie_dur=self.avg_sortie_dur,
+                                               counter=self.counter)
+        return self._pools[key]
+
+    def refresh(self):
+        self._pools.clear()
+
 def process_syllabus_event(
     event: SyllabusEvent, 
     upgrade_students: List[Pilot], 
     all_pilots: List[Pilot], 
     syllabus_upgrade_type: Upgrade,
-    noise: float
+    noise: float,
+    avg_sortie_dur: float = 0.0,
+    pools: Optional[SeatPools] = None,
+    sim_pools: Optional[SeatPools] = None
 ):
     """
     Allocates sorties for a specific syllabus event.
     CRITICAL FIX: Support sorties are now generated PER student sortie.
+    Pass 'pools' to reuse the eligible seat pools across events of one syllabus.
+    With 'sim_pools' (counter="sim_phase"), SIM events fill their seats as sims
+    instead of sorties.
     """
+    if pools is None:
+        pools = SeatPools(all_pilots, noise, avg_sortie_dur)
+    as_sim = sim_pools is not None and event.event_type == EventType.SIM
+    if as_sim:
+        pools = sim_pools
+
+    # Only IPs can instruct
+    ips = pools.get(Qual.IP, syllabus_upgrade_type)
+    wgs = pools.get(Qual.WG, syllabus_upgrade_type)
+    fls = pools.get(Qual.FL, syllabus_upgrade_type)
+
     for student in upgrade_students:
         # 1. Student Sorties (The student flies 'num_student' times for this event)
         for _ in range(event.num_student):
             
             # -- Student flies --
-            if hasattr(student, 'add_sortie'):
-                student.add_sortie("Blue")
+            if as_sim:
+                credit_sim(student)
             else:
-                student.sortie_phase += 1
-                student.sortie_blue_phase += 1
+                credit_sortie(student, "Blue", avg_sortie_dur)
             
             # -- Instructor flies (Per student sortie) --
             for _ in range(event.num_instructor):
-                # Only IPs can instruct
-                ips = [p for p in all_pilots if rules.can_fill_seat(p, Qual.IP, syllabus_upgrade_type)]
-                assign_sortie(ips, "Blue", noise)
+                ips.assign("Blue")
 
-            # -- Blue Wingmen (Per student sortie) --
+            # -- Support seats (Per student sortie), never filled by the student --
             for _ in range(event.num_blue_wg):
-                candidates = [p for p in all_pilots if rules.can_fill_seat(p, Qual.WG, syllabus_upgrade_type)]
-                # Filter out the student themselves if they are in the candidate list
-                candidates = [p for p in candidates if p is not student]
-                assign_sortie(candidates, "Blue", noise)
+                wgs.assign("Blue", exclude=student)
 
-            # -- Blue Flight Leads (Per student sortie) --
             for _ in range(event.num_blue_fl):
-                candidates = [p for p in all_pilots if rules.can_fill_seat(p, Qual.FL, syllabus_upgrade_type)]
-                candidates = [p for p in candidates if p is not student]
-                assign_sortie(candidates, "Blue", noise)
+                fls.assign("Blue", exclude=student)
 
-            # -- Red Wingmen (Per student sortie) --
             for _ in range(event.num_red_wg):
-                candidates = [p for p in all_pilots if rules.can_fill_seat(p, Qual.WG, syllabus_upgrade_type)]
-                candidates = [p for p in candidates if p is not student]
-                assign_sortie(candidates, "Red", noise)
+                wgs.assign("Red", exclude=student)
 
-            # -- Red Flight Leads (Per student sortie) --
             for _ in range(event.num_red_fl):
-                candidates = [p for p in all_pilots if rules.can_fill_seat(p, Qual.FL, syllabus_upgrade_type)]
-                candidates = [p for p in candidates if p is not student]
-                assign_sortie(candidates, "Red", noise)
+                fls.assign("Red", exclude=student)
 
 def run_upgrade_program(
     syllabus: List[SyllabusEvent],
     students: List[Pilot],
     all_pilots: List[Pilot],
     upgrade_type: Upgrade,
-    noise: float
+    noise: float,
+    avg_sortie_dur: float = 0.0,
+    count_sims: bool = False
 ):
+    # Nobody changes qual/upgrade mid-syllabus, so the pools are built once per run
+    pools = SeatPools(all_pilots, noise, avg_sortie_dur)
+    sim_pools = SeatPools(all_pilots, noise, avg_sortie_dur, counter="sim_phase") if count_sims else None
     for event in syllabus:
-        process_syllabus_event(event, students, all_pilots, upgrade_type, noise)
+        process_syllabus_event(event, students, all_pilots, upgrade_type, noise, avg_sortie_dur, pools, sim_pools)
 
 # ----------------------
 # Continuation Training (CT)
 # ----------------------
+def continuation_bucket_quantities(profile: ContinuationProfile, remaining_capacity: int) -> Dict:
+    """
+    Splits the remaining CT capacity into whole sorties per bucket.
+    """
+    # Calculate bucket sizes
+    raw_qty = [(b, remaining_capacity * b.fraction) for b in profile.buckets]
+    base_qty = {b: int(x) for b, x in raw_qty}
+    
+    # Distribute leftover "fractional" sorties
+    leftover = remaining_capacity - sum(base_qty.values())
+    sorted_remainders = sorted(raw_qty, key=lambda x: x[1]-int(x[1]), reverse=True)
+    
+    for i in range(leftover):
+        bucket = sorted_remainders[i % len(sorted_remainders)][0]
+        base_qty[bucket] += 1
+
+    return base_qty
+
 def allocate_continuation_training(
     pilots: List[Pilot],
     profile: ContinuationProfile,
     total_capacity: int,
-    noise: float
+    noise: float,
+    avg_sortie_dur: float = 0.0,
+    mode: str = "waterfill"
 ):
+    """
+    Spreads the capacity left after syllabi over the CONTINUATION_PROFILE buckets,
+    always to the least-flown eligible pilot.
+
+    mode="waterfill" computes each bucket's final per-pilot counts in closed form
+    (O(n log n) regardless of capacity) and is identical to mode="greedy", which
+    hands sorties out one at a time. Noise has no closed form, so noisy runs are
+    always greedy.
+    """
+    if mode not in ("waterfill", "greedy"):
+        raise ValueError(f"Unknown CT allocation mode '{mode}'")
+
     # Calculate how much capacity is left
     used_sorties = sum(p.sortie_phase for p in pilots)
     remaining_capacity = max(0, total_capacity - used_sorties)
@@ -169,32 +429,123 @@ def allocate_continuation_training(
     if not ct_candidates:
         return
 
-    # Calculate bucket sizes
-    raw_qty = [(b, remaining_capacity * b.fraction) for b in profile.buckets]
-    base_qty = {b: int(x) for b, x in raw_qty}
-    
-    # Distribute leftover "fractional" sorties
-    leftover = remaining_capacity - sum(base_qty.values())
-    sorted_remainders = sorted(raw_qty, key=lambda x: x[1]-int(x[1]), reverse=True)
-    
-    for i in range(leftover):
-        bucket = sorted_remainders[i % len(sorted_remainders)][0]
-        base_qty[bucket] += 1
+    base_qty = continuation_bucket_quantities(profile, remaining_capacity)
 
     # Execute allocation per bucket
     for bucket, qty in base_qty.items():
         # Find eligible pilots for this specific CT bucket
         # We access the internal hierarchy check from rules since CT doesn't have a syllabus upgrade type
         eligible = [p for p in ct_candidates if rules._qual_hierarchy_check(p.qual, bucket.min_qual)]
-        
+        if not eligible:
+            continue
+
+        if mode == "waterfill" and noise <= 0:
+            increments = water_fill([p.sortie_phase for p in eligible], qty, tie_break="recent")
+            for p, count in zip(eligible, increments.tolist()):
+                if count:
+                    credit_sorties(p, count, bucket.side, avg_sortie_dur)
+            continue
+
+        # One allocator per bucket; "recent" ties reproduce the old in-place re-sort
+        allocator = SortieAllocator(eligible, noise, tie_break="recent", avg_sortie_dur=avg_sortie_dur)
         for _ in range(qty):
-            assign_sortie(eligible, bucket.side, noise)
+            allocator.assign(bucket.side)
+
+# ----------------------
+# Kernel Backend
+# ----------------------
+def event_matrix(syllabus: List[SyllabusEvent]) -> np.ndarray:
+    """
+    Seat counts per event (rows) in the kernels.EVENT_* column order.
+    """
+    return np.array(
+        [[e.num_student, e.num_instructor, e.num_blue_wg, e.num_blue_fl, e.num_red_wg, e.num_red_fl] for e in syllabus],
+        dtype=np.int64,
+    ).reshape(-1, 6)
+
+def _index_pool(pilots: List[Pilot], keep) -> np.ndarray:
+    return np.array([i for i, p in enumerate(pilots) if keep(p)], dtype=np.int64)
+
+def run_allocation_kernels(
+    pilots: List[Pilot],
+    programs: List[tuple],
+    profile: ContinuationProfile,
+    total_capacity: int,
+    avg_sortie_dur: float = 0.0,
+    count_sims: bool = False
+):
+    """
+    Zero-noise syllabus + CT allocation over array-backed pilot state.
+    programs: [(syllabus, students, upgrade_type), ...] in execution order.
+    Counters are copied into arrays, run through src.kernels and written back.
+    count_sims: SIM events fill their seats on the sim counters (see run_upgrade_program).
+    """
+    sortie = np.array([p.sortie_phase for p in pilots], dtype=np.int64)
+    blue = np.array([p.sortie_blue_phase for p in pilots], dtype=np.int64)
+    red = np.array([p.sortie_red_phase for p in pilots], dtype=np.int64)
+    hours = np.array([p.hours_phase for p in pilots], dtype=np.float64)
+    sim = np.array([p.sim_phase for p in pilots], dtype=np.float64)
+    position = {id(p): i for i, p in enumerate(pilots)}
+
+    for syllabus, students, upgrade_type in programs:
+        if not students:
+            continue
+        student_index = np.array([position[id(p)] for p in students], dtype=np.int64)
+        pools = (
+            _index_pool(pilots, lambda p: rules.can_fill_seat(p, Qual.IP, upgrade_type)),
+            _index_pool(pilots, lambda p: rules.can_fill_seat(p, Qual.FL, upgrade_type)),
+            _index_pool(pilots, lambda p: rules.can_fill_seat(p, Qual.WG, upgrade_type)),
+        )
+        events = event_matrix(syllabus)
+        if count_sims:
+            # Sims have no side or hours, so those land in scratch arrays
+            is_sim = np.array([e.event_type == EventType.SIM for e in syllabus], dtype=bool)
+            scratch = np.zeros(len(pilots), dtype=np.int64)
+            kernels.program_kernel(sim, scratch, scratch.copy(), np.zeros(len(pilots)), student_index,
+                                   events[is_sim], *pools, 0.0)
+            events = events[~is_sim]
+        kernels.program_kernel(sortie, blue, red, hours, student_index, events, *pools, float(avg_sortie_dur))
+
+    remaining_capacity = max(0, total_capacity - int(sortie.sum()))
+    if remaining_capacity > 0:
+        base_qty = continuation_bucket_quantities(profile, remaining_capacity)
+        for bucket, qty in base_qty.items():
+            pool = _index_pool(pilots, lambda p: p.upgrade != Upgrade.MQT and rules._qual_hierarchy_check(p.qual, bucket.min_qual))
+            kernels.ct_bucket_kernel(sortie, blue, red, hours, pool, int(qty), bucket.side == "Red", float(avg_sortie_dur))
+
+    for i, p in enumerate(pilots):
+        p.sortie_phase = int(sortie[i])
+        p.sortie_blue_phase = int(blue[i])
+        p.sortie_red_phase = int(red[i])
+        p.hours_phase = float(hours[i])
+        p.sim_phase = float(sim[i])
 
 # ----------------------
 # Main Simulation Phase
 # ----------------------
-def run_phase_simulation(cfg: SquadronConfig, pilots: List[Pilot], allocation_noise: float = 0.0):
-    
+def run_phase_simulation(cfg: SquadronConfig, pilots: List[Pilot], allocation_noise: float = 0.0, backend: str = "python",
+                         timings: Optional[Dict[str, float]] = None, count_sims: bool = False):
+    """
+    Runs one phase for the squadron's pilots and returns them with phase stats.
+
+    backend="numba" runs the syllabus and CT allocation loops in src.kernels
+    (compiled when numba is installed, plain Python otherwise); results are
+    identical to backend="python". The kernels are zero-noise only, so noisy
+    runs always use the Python path.
+
+    count_sims=True flies only SORTIE syllabus events: SIM events fill their
+    seats on sim_phase (least-simmed eligible pilot, students excluded from
+    their own support seats) and use no aircraft capacity. Without it SIM
+    events are flown as sorties and every pilot gets a flat 3 sims per month.
+
+    timings: optional dict that seconds per stage ("syllabus", "ct", "finalize")
+    are added to; the numba kernels run both allocations as one "allocation" stage.
+    """
+    if backend not in ("python", "numba"):
+        raise ValueError(f"Unknown backend '{backend}'")
+
+    start = time.perf_counter()
+
     # 1. Reset Phase Counters
     for p in pilots:
         if hasattr(p, 'reset_counters'):
@@ -220,25 +571,38 @@ def run_phase_simulation(cfg: SquadronConfig, pilots: List[Pilot], allocation_no
     # run_upgrade_program(TEST_IPUG_SYLLABUS, ipug_students, pilots, Upgrade.IPUG, allocation_noise)
 
 
-    run_upgrade_program(MQT_SYLLABUS, mqt_students, pilots, Upgrade.MQT, allocation_noise)
-    run_upgrade_program(FLUG_SYLLABUS, flug_students, pilots, Upgrade.FLUG, allocation_noise)
-    run_upgrade_program(IPUG_SYLLABUS, ipug_students, pilots, Upgrade.IPUG, allocation_noise)
-
+    programs = [
+        (MQT_SYLLABUS, mqt_students, Upgrade.MQT),
+        (FLUG_SYLLABUS, flug_students, Upgrade.FLUG),
+        (IPUG_SYLLABUS, ipug_students, Upgrade.IPUG),
+    ]
 
-    # 4. Continuation Training
     # Scale capacity to phase length (e.g. 1 month vs 4 months)
     phase_months = cfg.phase_length_days / 30.0
     total_capacity = int(total_phase_capacity(cfg) * phase_months)
-    
-    allocate_continuation_training(pilots, CONTINUATION_PROFILE, total_capacity, allocation_noise)
+
+    if backend == "numba" and allocation_noise <= 0:
+        # 3 + 4. Syllabi and CT in the array kernels
+        run_allocation_kernels(pilots, programs, CONTINUATION_PROFILE, total_capacity, cfg.avg_sortie_dur, count_sims)
+        start = add_stage_time(timings, "allocation", start)
+    else:
+        for syllabus, students, upgrade_type in programs:
+            run_upgrade_program(syllabus, students, pilots, upgrade_type, allocation_noise, cfg.avg_sortie_dur, count_sims)
+        start = add_stage_time(timings, "syllabus", start)
+
+        # 4. Continuation Training
+        allocate_continuation_training(pilots, CONTINUATION_PROFILE, total_capacity, allocation_noise, cfg.avg_sortie_dur)
+        start = add_stage_time(timings, "ct", start)
 
     # 5. Finalize Stats
     for p in pilots:
         # Assuming sim is flat per month, scaled to phase
         months = cfg.phase_length_days / 30.0
-        p.sim_phase = 3 * phase_months
+        if not count_sims:
+            p.sim_phase = 3 * phase_months
         p.update_total()
         p.update_monthly(cfg.phase_length_days)
+    add_stage_time(timings, "finalize", start)
 
     return pilots
 
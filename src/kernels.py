@@ -0,0 +1,135 @@
+import numpy as np
+
+# ----------------------
+# Optional Numba JIT
+# ----------------------
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit: the kernels below run as plain Python.
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+# Columns of the per-event seat matrix passed to program_kernel
+EVENT_STUDENT, EVENT_INSTRUCTOR, EVENT_BLUE_WG, EVENT_BLUE_FL, EVENT_RED_WG, EVENT_RED_FL = range(6)
+
+# ----------------------
+# Allocation Kernels
+# ----------------------
+# All state is array-backed: pilot i's sorties live in sortie[i], blue[i], red[i],
+# hours[i]. Pools hold pilot indices in squadron order. Zero noise only; the
+# results are identical to SeatPools / SortieAllocator in engine.py.
+
+@njit(cache=True)
+def _pick(sortie, pool, exclude):
+    # Least-flown pilot, earliest in the pool on ties ("list" tie-break)
+    best = -1
+    for j in range(pool.shape[0]):
+        i = pool[j]
+        if i == exclude:
+            continue
+        if best == -1 or sortie[i] < sortie[best]:
+            best = i
+    return best
+
+@njit(cache=True)
+def _credit(sortie, blue, red, hours, i, is_red, dur):
+    sortie[i] += 1
+    if is_red:
+        red[i] += 1
+    else:
+        blue[i] += 1
+    hours[i] += dur
+
+@njit(cache=True)
+def program_kernel(sortie, blue, red, hours, students, events, ip_pool, fl_pool, wg_pool, dur):
+    """
+    Kernel for run_upgrade_program: walks every event, student and student sortie,
+    filling the instructor and support seats from the precomputed pools.
+    """
+    for e in range(events.shape[0]):
+        for s in range(students.shape[0]):
+            student = students[s]
+            for _ in range(events[e, EVENT_STUDENT]):
+                _credit(sortie, blue, red, hours, student, False, dur)
+
+                for _ in range(events[e, EVENT_INSTRUCTOR]):
+                    i = _pick(sortie, ip_pool, -1)
+                    if i >= 0:
+                        _credit(sortie, blue, red, hours, i, False, dur)
+
+                for _ in range(events[e, EVENT_BLUE_WG]):
+                    i = _pick(sortie, wg_pool, student)
+                    if i >= 0:
+                        _credit(sortie, blue, red, hours, i, False, dur)
+
+                for _ in range(events[e, EVENT_BLUE_FL]):
+                    i = _pick(sortie, fl_pool, student)
+                    if i >= 0:
+                        _credit(sortie, blue, red, hours, i, False, dur)
+
+                for _ in range(events[e, EVENT_RED_WG]):
+                    i = _pick(sortie, wg_pool, student)
+                    if i >= 0:
+                        _credit(sortie, blue, red, hours, i, True, dur)
+
+                for _ in range(events[e, EVENT_RED_FL]):
+                    i = _pick(sortie, fl_pool, student)
+                    if i >= 0:
+                        _credit(sortie, blue, red, hours, i, True, dur)
+
+@njit(cache=True)
+def program_rows_kernel(sortie, blue, red, students, ip_pool, fl_pool, wg_pool, events):
+    """
+    program_kernel for each row of (configs x pilots) arrays: students and the
+    seat pools are boolean masks of the same shape. Rows keep no hours.
+    """
+    hours = np.zeros(sortie.shape[1])
+    for r in range(sortie.shape[0]):
+        row_students = np.nonzero(students[r])[0]
+        if row_students.shape[0] == 0:
+            continue
+        program_kernel(sortie[r], blue[r], red[r], hours, row_students, events,
+                       np.nonzero(ip_pool[r])[0], np.nonzero(fl_pool[r])[0], np.nonzero(wg_pool[r])[0], 0.0)
+
+@njit(cache=True)
+def ct_bucket_kernel(sortie, blue, red, hours, pool, qty, is_red, dur):
+    """
+    Kernel for one CT bucket: hands out 'qty' sorties one at a time with the
+    "recent" tie-break (the pilot served last goes first among equals).
+    """
+    n = pool.shape[0]
+    if n == 0:
+        return
+    rank = np.arange(n)
+    inc = np.zeros(n, dtype=np.int64)
+    served = 0
+
+    for _ in range(qty):
+        best = 0
+        for j in range(1, n):
+            a = sortie[pool[j]]
+            b = sortie[pool[best]]
+            if a < b or (a == b and rank[j] < rank[best]):
+                best = j
+        sortie[pool[best]] += 1
+        inc[best] += 1
+        served += 1
+        rank[best] = -served
+
+    # Same hours bookkeeping as the waterfill CT path (one bulk credit per pilot)
+    for j in range(n):
+        if inc[j] > 0:
+            i = pool[j]
+            if is_red:
+                red[i] += inc[j]
+            else:
+                blue[i] += inc[j]
+            hours[i] += inc[j] * dur
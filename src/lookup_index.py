@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# Drill-Down Lookup
+# ----------------------
+# Soft-lock order of SquadronConfig.lookup_aging_rate, after the exact paa/ute lock
+DRILL_DOWN_VARS = ["exp_ratio", "ip_qty", "total_pilots"]
+CLOSEST_EPS = 0.00001  # float comparison slack on each soft lock
+
+def scan_closest_row(df: pd.DataFrame, stud_matrix, params: dict, norm_input_stud) -> int:
+    """
+    Reference drill-down over the whole table: row position of the lookup winner.
+    """
+    # --- 1. Environmental Lock (Exact Match) ---
+    mask = (df['paa'].values == params.get('paa')) & (df['ute'].values == params.get('ute'))
+    if not np.any(mask):
+        mask = np.ones(len(df), dtype=bool)
+
+    # --- 2. Sequential Soft Locks (The "Drill Down") ---
+    for var in DRILL_DOWN_VARS:
+        target_val = params.get(var, 0)
+        valid_values = df[var].values[mask]
+        if len(valid_values) > 0:
+            min_diff = np.min(np.abs(valid_values - target_val))
+            mask = mask & (np.abs(df[var].values - target_val) <= (min_diff + CLOSEST_EPS))
+
+    # --- 3. Student Distance Tie-Breaker ---
+    dists = np.zeros(len(df))
+    if stud_matrix is not None:
+        dists += np.sum((stud_matrix - norm_input_stud)**2, axis=1)
+    dists[~mask] = np.inf
+    return int(np.argmin(dists))
+
+class _Bucket:
+    """
+    Row positions of one paa/ute group, sorted by DRILL_DOWN_VARS then position,
+    with those columns in the same order.
+    """
+    def __init__(self, rows: np.ndarray, cols: list):
+        self.rows = rows
+        self.cols = [c[rows] for c in cols]
+        # NaNs break the sorted search; such buckets use the full scan
+        self.scan = any(c.dtype.kind == "f" and np.isnan(c).any() for c in self.cols)
+
+class AgingRateIndex:
+    """
+    Prebuilt index for the lookup_aging_rate drill-down.
+
+    Rows are bucketed by exact (paa, ute) and sorted by the soft-lock columns, so
+    each soft lock is a binary search inside the rows that survived the previous
+    one, and the student distance is only computed for the final survivors.
+    closest_row returns exactly the row scan_closest_row would.
+    """
+    def __init__(self, df: pd.DataFrame, stud_matrix=None):
+        self.df = df
+        self.stud_matrix = stud_matrix
+        self._cols = [df[var].values for var in DRILL_DOWN_VARS]
+        self._all = None
+
+        paa, ute = df['paa'].values, df['ute'].values
+        order = np.lexsort([np.arange(len(df))] + self._cols[::-1] + [ute, paa])
+        paa, ute = paa[order], ute[order]
+        starts = np.r_[0, 1 + np.flatnonzero((paa[1:] != paa[:-1]) | (ute[1:] != ute[:-1])), len(order)].tolist()
+        self._buckets = {}
+        for lo, hi in zip(starts[:-1], starts[1:]):
+            key = (paa[lo].item(), ute[lo].item())
+            if key == key:  # NaN paa/ute never match a lookup
+                self._buckets[key] = _Bucket(order[lo:hi], self._cols)
+
+    def _all_rows(self) -> _Bucket:
+        # No paa/ute match: the drill-down runs over every row
+        if self._all is None:
+            self._all = _Bucket(np.lexsort([np.arange(len(self.df))] + self._cols[::-1]), self._cols)
+        return self._all
+
+    def closest_row(self, params: dict, norm_input_stud=None) -> int:
+        """
+        Row position of the lookup winner for params (paa, ute, DRILL_DOWN_VARS);
+        norm_input_stud is the normalized student vector when stud_matrix is set.
+        """
+        bucket = self._buckets.get((params.get('paa'), params.get('ute')))
+        if bucket is None:
+            bucket = self._all_rows()
+        if bucket.scan:
+            return scan_closest_row(self.df, self.stud_matrix, params, norm_input_stud)
+
+        # Segments of bucket order in which the next soft-lock column is sorted
+        segments = [(0, len(bucket.rows))]
+        for k, var in enumerate(DRILL_DOWN_VARS):
+            target, col = params.get(var, 0), bucket.cols[k]
+            # |v - target| is unimodal over sorted v: the closest value neighbours the insertion point
+            min_diff = None
+            for lo, hi in segments:
+                pos = lo + np.searchsorted(col[lo:hi], target)
+                diff = np.min(np.abs(col[max(pos - 1, lo):min(pos + 1, hi)] - target))
+                min_diff = diff if min_diff is None else min(min_diff, diff)
+            limit = min_diff + CLOSEST_EPS
+
+            survivors = []
+            for lo, hi in segments:
+                slack = 1e-9 * (1 + abs(limit) + abs(target))
+                a = lo + np.searchsorted(col[lo:hi], target - limit - slack, side="left")
+                b = lo + np.searchsorted(col[lo:hi], target + limit + slack, side="right")
+                keep = np.flatnonzero(np.abs(col[a:b] - target) <= limit)
+                if len(keep) == 0:
+                    continue
+                s, e = a + keep[0], a + keep[-1] + 1
+                # Split into runs of one value, inside which the next column is sorted
+                cuts = (s + 1 + np.flatnonzero(col[s + 1:e] != col[s:e - 1])).tolist()
+                survivors.extend(zip([s] + cuts, cuts + [e]))
+            segments = survivors
+
+        if not segments:
+            return 0  # nothing survived (NaN target): the scan's argmin over all-inf
+        rows = np.concatenate([bucket.rows[lo:hi] for lo, hi in segments])
+        if self.stud_matrix is None:
+            return int(rows.min())
+        dists = np.sum((self.stud_matrix[rows] - norm_input_stud)**2, axis=1)
+        nan = np.isnan(dists)
+        if nan.any():
+            return int(rows[nan].min())  # argmin picks the first NaN
+        return int(rows[dists == dists.min()].min())
@@ -1,26 +1,41 @@
 import pandas as pd
-from typing import List
-from src.models import Pilot, Qual, SquadronConfig, Upgrade, Assignment, AgingRate
+import numpy as np
+from typing import List, Optional
+from src.models import Pilot, Qual, SquadronConfig, Upgrade, Assignment, AgingRate, predict_aging_rates, check_brain
+from src.lookup_index import AgingRateIndex
+from src.rate_cache import RateCache
+from src.rate_surface import RateSurface
 import os
 from debug_lookup import diagnose_lookup
 import joblib
 
 
 class CAFSimulation:
-    def __init__(self, path: str, sim_upgrades: bool, flug_window_start: int = 250, ipug_window_start: int = 400):
+    def __init__(self, path: str, sim_upgrades: bool, flug_window_start: int = 250, ipug_window_start: int = 400,
+                 rate_cache: Optional[RateCache] = None, rate_surface: Optional[str] = None):
+        """
+        rate_cache: optional RateCache in front of the brain; pass the same one to
+        every replicate in a process so later runs reuse earlier predictions.
+        rate_surface: path of a RateSurface .npy (python -m src.rate_surface) to
+        interpolate rates from instead of loading sortie_brain.pkl.
+        """
         self.history = []
         self.current_year = 2025
         self.squadrons: List[SquadronConfig] = []
         self.flug_window_start = flug_window_start # Sorties for FLUG auto-start
         self.ipug_window_start = ipug_window_start # Hours for IPUG auto-start
+        self.rate_cache = rate_cache
 
         if not os.path.exists(path):
             raise FileNotFoundError(f'Lookup File Not Found at {path}.')    
         
         brain_path = "sortie_brain.pkl"
-        if os.path.exists(brain_path):
+        if rate_surface is not None:
+            print(f"📐 Loading Rate Surface from {rate_surface}...")
+            self.brain = RateSurface.load(rate_surface).as_brain()
+        elif os.path.exists(brain_path):
             print(f"🧠 Loading Sortie Brain from {brain_path}...")
-            self.brain = joblib.load(brain_path)
+            self.brain = check_brain(joblib.load(brain_path))
         else:
             raise FileNotFoundError(f"Could not find {brain_path}. Please run train_brain.py first.")
         
@@ -48,6 +63,17 @@ class CAFSimulation:
         else:
             self.norm_stud_matrix = None
             self.stud_std = None
+        self._lookup_index = None
+
+    @property
+    def lookup_index(self) -> AgingRateIndex:
+        """
+        AgingRateIndex over the lookup table for SquadronConfig.lookup_aging_rate
+        (index=...), built on first use.
+        """
+        if self._lookup_index is None:
+            self._lookup_index = AgingRateIndex(self.df, self.norm_stud_matrix)
+        return self._lookup_index
 
     @property
     def all_pilots(self):
@@ -90,10 +116,10 @@ class CAFSimulation:
         if num_sq == 0:
             return
 
-        for i in range(count):
-            target_sq = self.squadrons[i % num_sq]
-            
-            new_pilot = (Pilot(
+        # Round-robin intake: squadron j gets every num_sq-th graduate
+        for j, target_sq in enumerate(self.squadrons):
+            target_sq.pilots.append_many(
+                count // num_sq + (1 if j < count % num_sq else 0),
                 qual=Qual.WG,
                 upgrade=Upgrade.MQT,
                 year_group=year,
@@ -102,16 +128,11 @@ class CAFSimulation:
                 squadron_id=target_sq.id,
                 hours_flown=50,
                 sorties_flown=50 
-            ))
-
-            target_sq.pilots.append(new_pilot)
+            )
 
+        # total_pilots / experience_ratio are live counts on the squadron
         for sq in self.squadrons:
-            mqt_count = sum(1 for p in sq.pilots if p.active and p.upgrade == Upgrade.MQT)
-            sq.mqt_students = mqt_count
-            sq.total_pilots = sum(1 for p in sq.pilots if p.active and p.current_assignment == Assignment.LINE)
-            exp_pilots = sum(1 for p in sq.pilots if p.active and p.current_assignment == Assignment.LINE and p.qual != Qual.WG)
-            sq.experience_ratio = exp_pilots / sq.total_pilots
+            sq.mqt_students = sq.pilots.count(upgrade=Upgrade.MQT)
 
 
     # def run_simulation(self, years_to_run: int, annual_intake: int, retention_rate: float, squadron_configs: List[SquadronConfig], ute: float = 10.0):
@@ -151,8 +172,20 @@ class CAFSimulation:
                     sq.mqt_students = mqt_count
                     sq.flug_students = flug_count
                     sq.ipug_students = ipug_count
-                    
-                    rates = sq.predict_aging_rate(self.brain)
+
+                # One brain call per model for the whole phase. An ADSC roll at the first
+                # squadron's end of phase would change later squadrons' inputs, so when one
+                # is due for them the rates are predicted squadron by squadron instead.
+                if self.retention_roll_due(self.squadrons[1:]):
+                    phase_rates = None
+                else:
+                    phase_rates = predict_aging_rates(self.squadrons, self.brain, self.rate_cache)
+
+                for i, sq in enumerate(self.squadrons):
+                    if phase_rates is None:
+                        rates = sq.predict_aging_rate(self.brain, self.rate_cache)
+                    else:
+                        rates = phase_rates[i]
 
                     sq.apply_phase_aging(rates)
 
@@ -160,43 +193,44 @@ class CAFSimulation:
             
         return pd.DataFrame(self.history)
 
+    @staticmethod
+    def retention_roll_due(squadrons: List[SquadronConfig]) -> bool:
+        """
+        True if any active pilot in squadrons is past their ADSC (rolled for
+        retention at the next end of phase).
+        """
+        for sq in squadrons:
+            t = sq.pilots
+            if len(t) and np.any(t.active & (t.adsc_remaining <= 0)):
+                return True
+        return False
+
     def process_end_of_phase(self, sq: SquadronConfig, year: int, phase_num: int, retention_rate: float, rates: AgingRate):
-        for p in self.active_pilots:
-            p.check_retention(year, phase_num, retention_rate)
+        # Same roll order as iterating self.active_pilots: only pilots past their ADSC roll
+        for other in self.squadrons:
+            adsc = other.pilots.adsc_remaining
+            if len(adsc) and adsc.min() <= 0:
+                t = other.pilots
+                for i in np.flatnonzero(t.active & (adsc <= 0)):
+                    t[int(i)].check_retention(year, phase_num, retention_rate)
 
         months = sq.phase_length_days / 30
         limit = sq.manning_limit
 
-        wg_count = 0
-        fl_count = 0
-        ip_count = 0
-        staff_ips = 0
-        staff_fls = 0
-        separated_count = 0
-        retained_count = 0
-        line_pilot_count = 0
-
-        for p in sq.pilots:
-            if not p.active:
-                if p.separation_date == (year, phase_num):
-                    separated_count += 1
-                continue
-
-            if p.adsc_remaining == 24.1:
-                p.adsc_remaining = 24
-                retained_count += 1
-
-            if p.current_assignment == Assignment.STAFF:
-                if p.qual == Qual.IP: staff_ips += 1
-                elif p.qual == Qual.FL: staff_fls += 1 
-                if p.upgrade != Upgrade.NONE:
-                    raise AssertionError(f'Pilots are moving to staff in an upgrade status. Check pilot logic.')
-
-            elif p.current_assignment == Assignment.LINE:
-                line_pilot_count += 1
-                if p.qual == Qual.WG: wg_count += 1
-                elif p.qual == Qual.FL: fl_count += 1
-                elif p.qual == Qual.IP: ip_count += 1
+        t = sq.pilots
+        active = t.active
+        separated_count = sum(1 for i in np.flatnonzero(~active) if t.separation_date[i] == (year, phase_num))
+
+        retained = active & (t.adsc_remaining == 24.1)
+        t.adsc_remaining[retained] = 24
+        retained_count = int(np.count_nonzero(retained))
+
+        _, staff_fls, staff_ips = t.count_by_qual(Assignment.STAFF)
+        if t.count(upgrade=[Upgrade.MQT, Upgrade.FLUG, Upgrade.IPUG], assignment=Assignment.STAFF):
+            raise AssertionError(f'Pilots are moving to staff in an upgrade status. Check pilot logic.')
+
+        wg_count, fl_count, ip_count = t.count_by_qual(Assignment.LINE)
+        line_pilot_count = wg_count + fl_count + ip_count
         
         exp_ratio = 0
         if line_pilot_count > 0:
@@ -228,37 +262,24 @@ class CAFSimulation:
 
         sq.graduate_current_upgrades()
 
-        current_line_pilots = []
-        for p in sq.pilots:
-            if p.active and p.current_assignment == Assignment.LINE:
-                current_line_pilots.append(p)
+        current_line_pilots = np.flatnonzero(t.active & (t.current_assignment == Assignment.LINE.code))
 
         if len(current_line_pilots) > limit:
             excess_count = len(current_line_pilots) - limit
 
-            ips = []
-            fls = []
-            for p in current_line_pilots:
-                if p.qual == Qual.IP: ips.append(p)
-                elif p.qual == Qual.FL: fls.append(p)
-
-            ips.sort(key=lambda x: x.year_group)
-            fls.sort(key=lambda x: x.year_group)
+            # Stable sorts by year group, as list.sort did
+            ips = current_line_pilots[t.qual[current_line_pilots] == Qual.IP.code]
+            fls = current_line_pilots[t.qual[current_line_pilots] == Qual.FL.code]
+            ips = ips[np.argsort(t.year_group[ips], kind="stable")]
+            fls = fls[np.argsort(t.year_group[fls], kind="stable")]
 
-            eligible_ips = ips[3:] if len(ips) > 3 else [] # Protects Sq/CC, DO, and WO
+            eligible_ips = ips[3:] # Protects Sq/CC, DO, and WO
 
-            funnel_queue = eligible_ips + fls
+            funnel_queue = np.concatenate([eligible_ips, fls])
             movers_count = min(excess_count, len(funnel_queue))
         
-            for i in range(int(movers_count)): # Not sure why streamlit thinks this is a float
-                funnel_queue[i].move_to_staff()
-
-        active_pilots_only = []
-        for p in sq.pilots:
-            p.reset_phase_counters()
-            if p.active:
-                active_pilots_only.append(p)
-            
-        sq.pilots = active_pilots_only
-            
+            for i in funnel_queue[:int(movers_count)]: # Not sure why streamlit thinks this is a float
+                t[int(i)].move_to_staff()
 
+        t.reset_phase_counters()
+        t.compact(t.active)
@@ -1,5 +1,6 @@
 from src.models import SquadronConfig, Pilot, Qual, Upgrade
 from src.manning_engine import CAFSimulation
+from src.rate_cache import RateCache
 import random
 from typing import Optional
 
@@ -26,8 +27,9 @@ WG_SORTIE_END = 300
 
 path = 'outputs/simulation_results.parquet'
 
-def setup_simulation(sim_upgrades: bool = False):
-    sim = CAFSimulation(path, sim_upgrades)
+def setup_simulation(sim_upgrades: bool = False, rate_cache: Optional[RateCache] = None,
+                     rate_surface: Optional[str] = None):
+    sim = CAFSimulation(path, sim_upgrades, rate_cache=rate_cache, rate_surface=rate_surface)
 
     squadron_manning_targets = [
         {"total": 27, "exp": 0.5}, # Get Exp Ratio from FR1/2
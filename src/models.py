@@ -1,10 +1,12 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from enum import Enum
 import random
 from typing import List, Optional
 from math import sqrt
 import pandas as pd
 import numpy as np
+from src.lookup_index import scan_closest_row
+from src.rate_cache import RateCache, RATE_FEATURES, RATE_TARGETS, BRAIN_VERSION
 
 # ----------------------
 # Math 
@@ -16,12 +18,22 @@ def square(x): return x**2
 # Enums & Simple Classes
 # ----------------------
 
-class Qual(Enum):
+class _Coded(Enum):
+    """
+    Enum whose members also carry .code, their definition index (0, 1, ...), which
+    is what PilotTable columns store. Members only equal themselves; compare array
+    columns against .code. Quals are defined WG < FL < IP, so comparing codes is
+    the seat hierarchy check.
+    """
+    def __init__(self, *args):
+        self.code = len(type(self).__members__)
+
+class Qual(_Coded):
     WG = 'WG'
     FL = 'FL'
     IP = 'IP'
 
-class Upgrade(Enum):
+class Upgrade(_Coded):
     NONE = 'None'
     MQT = 'MQT'
     FLUG = 'FLUG'
@@ -31,7 +43,7 @@ class EventType(Enum):
     SORTIE = "sortie"
     SIM = "sim"
 
-class Assignment(Enum):
+class Assignment(_Coded):
     LINE = 'LINE'
     STAFF = 'STAFF'
     TRAINING = 'TRAINING'
@@ -50,27 +62,30 @@ class AgingRate:
 # ----------------------
 # Pilot Entity
 # ----------------------
-@dataclass
+@dataclass(slots=True)
 class Pilot:
     qual: Qual = Qual.WG 
     upgrade: Upgrade = Upgrade.NONE
-    sortie_phase: float = 0 
+    sortie_phase: int = 0 
     hours_phase: float = 0
     sim_phase: float = 0 
     total_phase: float = 0 
-    sortie_blue_phase: float = 0 
-    sortie_red_phase: float = 0 
+    sortie_blue_phase: int = 0 
+    sortie_red_phase: int = 0 
 
     sortie_monthly: float = 0
     sim_monthly: float = 0
     sortie_blue_monthly: float = 0
     sortie_red_monthly: float = 0
 
+    target_sorties: float = 0
+    rap_shortfall: float = 0
+
     year_group: int = 9999
-    squadron_id: int = 99
-    sorties_flown: int = 0
-    hours_flown: int = 0
-    adsc_remaining: int = 120 # Measured in months
+    squadron_id: Optional[int] = 99
+    sorties_flown: float = 0
+    hours_flown: float = 0
+    adsc_remaining: float = 120 # Measured in months
     active: bool = True
     separation_date: tuple = (9999, 0)
     current_assignment: Assignment = Assignment.LINE
@@ -146,6 +161,307 @@ class Pilot:
         self.squadron_id = None
     
 
+# ----------------------
+# Pilot Table (Columnar)
+# ----------------------
+_ENUM_COLUMNS = {"qual": Qual, "upgrade": Upgrade, "current_assignment": Assignment}
+_DTYPES = {bool: np.bool_, int: np.int64, float: np.float64}
+
+# One NumPy dtype per Pilot field; fields that are not enum/bool/int/float
+# (squadron_id may be None, separation_date is a tuple) are object columns
+PILOT_COLUMNS = {
+    f.name: np.dtype(np.int8 if f.name in _ENUM_COLUMNS else _DTYPES.get(f.type, object))
+    for f in fields(Pilot)
+}
+_DEFAULTS = {f.name: f.default for f in fields(Pilot)}
+
+# Columns that index PilotTable.counts; their column arrays are read-only views,
+# so every write goes through PilotTable.write / PilotRow and keeps counts current
+COUNT_KEYS = ("qual", "upgrade", "current_assignment", "active")
+COUNT_SHAPE = (len(Qual), len(Upgrade), len(Assignment), 2)
+
+def _code(value):
+    # Enum members are stored as their .code; everything else as given
+    return value.code if isinstance(value, _Coded) else value
+
+def _count_key(value):
+    if value is None:
+        return slice(None)
+    if isinstance(value, (list, tuple)):
+        return [int(_code(v)) for v in value]
+    return int(_code(value))
+
+def _table_column(name):
+    def get(self):
+        return self.column(name)
+    return property(get)
+
+def _view_column(name):
+    def get(self):
+        return self._table.column(name)[self._index]
+    def set(self, value):
+        self._table.write(name, self._index, value)
+    return property(get, set)
+
+def _row_column(name):
+    dtype = PILOT_COLUMNS[name]
+    if name in _ENUM_COLUMNS:
+        members = tuple(_ENUM_COLUMNS[name])
+        convert = members.__getitem__
+    elif dtype == object:
+        convert = None
+    else:
+        convert = {"b": bool, "i": int, "f": float}[dtype.kind]
+
+    def get(self):
+        value = self._table._cols[name][self._i]
+        return value if convert is None else convert(value)
+    def set(self, value):
+        self._table._cols[name][self._i] = value
+    def set_counted(self, value):
+        t = self._table
+        t._tally(self._i, -1)
+        t._cols[name][self._i] = _code(value)
+        t._tally(self._i, 1)
+    return property(get, set_counted if name in COUNT_KEYS else set)
+
+class PilotRow:
+    """
+    Pilot-like proxy for row i of a PilotTable. Reads and writes go straight to
+    the table's columns; rows are invalidated when the table is compacted.
+    """
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table: "PilotTable", i: int):
+        self._table = table
+        self._i = i
+
+    def to_pilot(self) -> Pilot:
+        return Pilot(**{name: getattr(self, name) for name in PILOT_COLUMNS})
+
+    def __repr__(self):
+        return f"PilotRow({self._i}, {self.to_pilot()!r})"
+
+class PilotView:
+    """
+    Boolean-mask (or index) selection of a PilotTable. Column reads return copies,
+    column assignments write through, iteration yields PilotRow proxies.
+    """
+    def __init__(self, table: "PilotTable", index: np.ndarray):
+        self._table = table
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return (PilotRow(self._table, int(i)) for i in self._index)
+
+class PilotTable:
+    """
+    A squadron's pilots stored column-wise, one NumPy array per Pilot field.
+
+    table.qual, table.active, ... are the live column arrays (writes go through),
+    table[mask] is a PilotView and iterating yields PilotRow proxies, so code
+    written against List[Pilot] keeps working while hot paths use the columns.
+
+    counts[qual, upgrade, assignment, active] is kept current on every append,
+    write and compaction, so count() is a lookup rather than a scan.
+    """
+    def __init__(self, pilots=()):
+        self._n = 0
+        self._cols = None  # allocated on first append
+        self._views = {}   # column views over the first _n rows, rebuilt when _n changes
+        self.counts = np.zeros(COUNT_SHAPE, dtype=np.int64)
+        self.extend(pilots)
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return (PilotRow(self, i) for i in range(self._n))
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            i = int(key) + (self._n if key < 0 else 0)
+            if not 0 <= i < self._n:
+                raise IndexError("pilot index out of range")
+            return PilotRow(self, i)
+        key = np.asarray(key)
+        index = np.flatnonzero(key) if key.dtype == np.bool_ else key
+        return PilotView(self, index)
+
+    def column(self, name: str) -> np.ndarray:
+        col = self._views.get(name)
+        if col is None:
+            if self._cols is None:
+                return np.empty(0, dtype=PILOT_COLUMNS[name])
+            col = self._cols[name][:self._n]
+            if name in COUNT_KEYS:
+                col.flags.writeable = False
+            self._views[name] = col
+        return col
+
+    def write(self, name: str, index, value):
+        """
+        Sets rows 'index' (boolean mask or indices) of a column to value.
+        """
+        if self._cols is None:
+            return
+        value = _code(value)
+        col = self._cols[name][:self._n]
+        if name not in COUNT_KEYS:
+            col[index] = value
+            return
+        index = np.asarray(index)
+        if index.dtype == np.bool_:
+            index = np.flatnonzero(index)
+        if not len(index):
+            return
+        self._tally(index, -1)
+        col[index] = value
+        self._tally(index, 1)
+
+    def _tally(self, index, sign: int):
+        # Adds sign to the count cell of each row in index (an int or index array)
+        cols = self._cols
+        if isinstance(index, int):
+            cell = (int(cols["qual"][index]), int(cols["upgrade"][index]),
+                    int(cols["current_assignment"][index]), int(cols["active"][index]))
+            self.counts[cell] += sign
+        else:
+            np.add.at(self.counts, tuple(cols[k][index].astype(np.intp) for k in COUNT_KEYS), sign)
+
+    def count(self, qual=None, upgrade=None, assignment=None, active=True) -> int:
+        """
+        Pilots matching every given code (None = any; a list matches any of its
+        codes). Counts active pilots unless active=None or False is passed.
+        """
+        key = (_count_key(qual), _count_key(upgrade), _count_key(assignment), _count_key(active))
+        return int(self.counts[key].sum())
+
+    def count_by_qual(self, assignment=None, active=True) -> List[int]:
+        """
+        [WG, FL, IP] counts (indexed by Qual code) in one read.
+        """
+        key = (slice(None), slice(None), _count_key(assignment), _count_key(active))
+        by_qual = self.counts[key].reshape(len(Qual), -1).sum(axis=1)
+        return by_qual.tolist()
+
+    def _reserve(self, n: int):
+        cap = 0 if self._cols is None else len(self._cols["qual"])
+        if n <= cap:
+            return
+        cap = max(16, n, 2 * cap)
+        cols = {name: np.empty(cap, dtype=dtype) for name, dtype in PILOT_COLUMNS.items()}
+        if self._cols is not None:
+            for name, col in cols.items():
+                col[:self._n] = self._cols[name][:self._n]
+        self._cols = cols
+
+    def append(self, pilot):
+        """
+        Copies a Pilot (or PilotRow) into a new row.
+        """
+        self._reserve(self._n + 1)
+        for name in PILOT_COLUMNS:
+            self._cols[name][self._n] = _code(getattr(pilot, name))
+        self._tally(self._n, 1)
+        self._n += 1
+        self._views = {}
+
+    def extend(self, pilots):
+        for p in pilots:
+            self.append(p)
+
+    def append_many(self, count: int, **values):
+        """
+        Bulk append: 'count' identical new rows, Pilot defaults unless given in values.
+        """
+        unknown = set(values) - set(PILOT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown pilot fields: {sorted(unknown)}")
+        if count <= 0:
+            return
+        start, stop = self._n, self._n + count
+        self._reserve(stop)
+        for name, col in self._cols.items():
+            value = _code(values.get(name, _DEFAULTS[name]))
+            if col.dtype == object:
+                for i in range(start, stop):
+                    col[i] = value
+            else:
+                col[start:stop] = value
+        self.counts[tuple(int(self._cols[k][start]) for k in COUNT_KEYS)] += count
+        self._n = stop
+        self._views = {}
+
+    def compact(self, keep: np.ndarray) -> int:
+        """
+        Drops the rows where keep is False (order preserved). Returns the count removed.
+        Outstanding PilotRow / PilotView objects are invalid afterwards.
+        """
+        keep = np.array(keep, dtype=bool)  # copy: keep may be a live column
+        kept = int(np.count_nonzero(keep))
+        if kept < self._n:
+            self._tally(np.flatnonzero(~keep), -1)
+            for name, col in self._cols.items():
+                col[:kept] = col[:self._n][keep]
+        removed, self._n = self._n - kept, kept
+        self._views = {}
+        return removed
+
+    def reset_phase_counters(self):
+        # Column form of Pilot.reset_phase_counters
+        for name in ("sortie_phase", "hours_phase", "sortie_blue_phase", "sortie_red_phase", "sim_phase"):
+            self.column(name)[:] = 0
+
+# Qual each upgrade graduates to, indexed by Upgrade code (NONE keeps its qual)
+_GRADUATE_QUAL = np.array([-1, Qual.WG.code, Qual.FL.code, Qual.IP.code], dtype=np.int8)
+
+for _name in PILOT_COLUMNS:
+    setattr(PilotTable, _name, _table_column(_name))
+    setattr(PilotView, _name, _view_column(_name))
+    setattr(PilotRow, _name, _row_column(_name))
+
+# Rows run the Pilot methods unchanged (they only use attribute access)
+for _name in ("update_total", "update_monthly", "reset_phase_counters", "add_sortie", "graduate",
+              "age_one_phase_with_rates", "check_retention", "move_to_staff"):
+    setattr(PilotRow, _name, getattr(Pilot, _name))
+
+# ----------------------
+# Rate Prediction
+# ----------------------
+def check_brain(brain: dict) -> dict:
+    """
+    Validates a loaded sortie brain (see BRAIN_VERSION) and returns it.
+    """
+    version = brain.get("version", 1)
+    if version == 1:
+        return brain
+    if version != BRAIN_VERSION:
+        raise ValueError(f"Unsupported sortie brain version {version}; expected 1 or {BRAIN_VERSION}")
+    if list(brain["features"]) != RATE_FEATURES or list(brain["targets"]) != RATE_TARGETS:
+        raise ValueError(f"Sortie brain was trained on {brain['features']} -> {brain['targets']}; "
+                         f"expected {RATE_FEATURES} -> {RATE_TARGETS}")
+    return brain
+
+def predict_monthly_rates(brain: dict, features) -> np.ndarray:
+    """
+    Monthly rates (RATE_TARGETS order) the brain predicts for one RATE_FEATURES
+    vector, or one row of rates per row of a feature matrix (one predict call
+    per model for the whole matrix). Raises KeyError if the brain lacks a
+    target model.
+    """
+    features = np.asarray(features, dtype=float)
+    X = np.atleast_2d(features)  # 2D array for sklearn
+    if "model" in brain:
+        # Multi-output brain: every target from one pass over the forest
+        rates = np.asarray(brain["model"].predict(X), dtype=float).reshape(len(X), len(RATE_TARGETS))
+    else:
+        rates = np.column_stack([brain[target].predict(X) for target in RATE_TARGETS])
+    return rates[0] if features.ndim == 1 else rates
+
 # ----------------------
 # Squadron Config 
 # ----------------------
@@ -164,30 +480,43 @@ class SquadronConfig:
     _total_pilots: Optional[int] = None
     _experience_ratio: Optional[float] = None
 
-    pilots: List[Pilot] = field(default_factory=list)
+    pilots: PilotTable = field(default_factory=PilotTable)
+
+    def __post_init__(self):
+        if not isinstance(self.pilots, PilotTable):
+            self.pilots = PilotTable(self.pilots)
+
+    # total_pilots / experience_ratio are live LINE counts from the pilot table.
+    # The overrides describe squadrons that have no pilots (research sweep configs)
+    # and cannot be set once pilots exist, so they never drift from the roster.
+    def _check_override(self, name: str):
+        if len(self.pilots):
+            raise ValueError(f"{name} is derived from the squadron's pilots and cannot be overridden")
 
     @property
     def total_pilots(self) -> int:
-        if self._total_pilots is not None:
+        if self._total_pilots is not None and not len(self.pilots):
             return self._total_pilots
-        return sum(1 for p in self.pilots if p.active)
+        return self.pilots.count(assignment=Assignment.LINE)
     
     @total_pilots.setter
     def total_pilots(self, value: int):
+        self._check_override("total_pilots")
         self._total_pilots = value
 
     @property
     def experience_ratio(self) -> float:
-        if self._experience_ratio is not None:
+        if self._experience_ratio is not None and not len(self.pilots):
             return self._experience_ratio
         
         tp = self.total_pilots
         if tp == 0: return 0.0
-        exp_count = sum(1 for p in self.pilots if p.active and p.qual in [Qual.FL, Qual.IP] and p.current_assignment == Assignment.LINE)
+        exp_count = self.pilots.count(qual=[Qual.FL, Qual.IP], assignment=Assignment.LINE)
         return exp_count/tp
     
     @experience_ratio.setter
     def experience_ratio(self, value:float):
+        self._check_override("experience_ratio")
         self._experience_ratio = value
 
     @property
@@ -195,62 +524,52 @@ class SquadronConfig:
         return 1.5 * self.paa
 
     def graduate_current_upgrades(self):
-        for pilot in self.pilots:
-            if pilot.upgrade != Upgrade.NONE:
-                pilot.graduate()
+        # Column form of Pilot.graduate
+        t = self.pilots
+        grads = t.upgrade != Upgrade.NONE.code
+        t.write("qual", grads, _GRADUATE_QUAL[t.upgrade[grads]])
+        t.write("upgrade", grads, Upgrade.NONE)
 
         self.mqt_students = 0
         self.flug_students = 0
         self.ipug_students = 0
-        self.ip_qty = sum(1 for p in self.pilots if p.active and p.qual == Qual.IP and p.current_assignment == Assignment.LINE)
-        self.total_pilots = sum(1 for p in self.pilots if p.active and p.current_assignment == Assignment.LINE)
-        fl_count = sum(1 for p in self.pilots if p.active and p.current_assignment == Assignment.LINE and p.qual == Qual.FL)
-
-        self.experience_ratio = (self.ip_qty + fl_count) / self.total_pilots # TODO is this right? or setter/getter?
+        self.ip_qty = t.count(qual=Qual.IP, assignment=Assignment.LINE)
 
 
     def new_phase_upgrades(self, flug_window_start:int, ipug_window_start:int):
-        mqt_count = sum(1 for p in self.pilots if p.upgrade == Upgrade.MQT)
+        t = self.pilots
+        mqt_count = t.count(upgrade=Upgrade.MQT, active=None)
 
-        flug_eligible = [
-            p for p in self.pilots if p.qual == Qual.WG and p.upgrade == Upgrade.NONE 
-            and flug_window_start <= p.sorties_flown 
-        ]
-        for p in flug_eligible:
-            p.upgrade = Upgrade.FLUG
+        flug_eligible = (t.qual == Qual.WG.code) & (t.upgrade == Upgrade.NONE.code) & (flug_window_start <= t.sorties_flown)
+        ipug_eligible = (t.qual == Qual.FL.code) & (t.upgrade == Upgrade.NONE.code) & (ipug_window_start <= t.hours_flown)
+        t.write("upgrade", flug_eligible, Upgrade.FLUG)
+        t.write("upgrade", ipug_eligible, Upgrade.IPUG)
 
-        ipug_eligible = [
-            p for p in self.pilots if p.qual == Qual.FL and p.upgrade == Upgrade.NONE 
-            and ipug_window_start <= p.hours_flown 
-        ]
-        for p in ipug_eligible:
-            p.upgrade = Upgrade.IPUG
-
-        return mqt_count, len(flug_eligible), len(ipug_eligible)
+        return mqt_count, int(np.count_nonzero(flug_eligible)), int(np.count_nonzero(ipug_eligible))
         
     def apply_phase_aging(self, rates: AgingRate):
         "Ages pilots by adding phase aging rate in hours/sorties and subtracts phase length from ADSC remaining."
 
-        for p in self.pilots:
-            if p.qual == Qual.IP:
-                p_rate = rates.ip_phase
-            elif p.qual == Qual.FL:
-                p_rate = rates.fl_phase
-            elif p.upgrade == Upgrade.MQT:
-                p_rate = rates.mqt_phase
-            else:
-                p_rate = rates.wg_phase
+        t = self.pilots
+        p_rate = np.select(
+            [t.qual == Qual.IP.code, t.qual == Qual.FL.code, t.upgrade == Upgrade.MQT.code],
+            [rates.ip_phase, rates.fl_phase, rates.mqt_phase],
+            rates.wg_phase,
+        )
 
-            p.age_one_phase_with_rates(p_rate, self.avg_sortie_dur)
+        # Column form of Pilot.age_one_phase_with_rates
+        act = t.active.copy()
+        t.sorties_flown[act] += p_rate[act]
+        t.hours_flown[act] += p_rate[act] * self.avg_sortie_dur
+        t.adsc_remaining[act & (t.adsc_remaining > 0)] -= 4
+        t.write("upgrade", act & (t.upgrade == Upgrade.MQT.code), Upgrade.NONE)
 
     def calc_aging_rate(self, sim_upgrades: bool):
         phase_months = self.phase_length_days / 30
         
         ute = self.ute
         paa = self.paa
-        wg_count = sum(1 for p in self.pilots if p.active and p.current_assignment == Assignment.LINE and p.qual == Qual.WG)
-        fl_count = sum(1 for p in self.pilots if p.active and p.current_assignment == Assignment.LINE and p.qual == Qual.FL)
-        ip_count = sum(1 for p in self.pilots if p.active and p.current_assignment == Assignment.LINE and p.qual == Qual.IP)
+        wg_count, fl_count, ip_count = self.pilots.count_by_qual(Assignment.LINE)
         exp_pilots = fl_count + ip_count # TODO Where do we re-hack experience ratio? Must just include LINE pilots
 
         if not sim_upgrades:
@@ -274,14 +593,17 @@ class SquadronConfig:
     def lookup_aging_rate(self, params: dict, original_df: pd.DataFrame, 
                                   base_matrix, base_std, base_cols, 
                                   stud_matrix, stud_std, stud_cols, 
-                                  sim_upgrades: bool) -> 'AgingRate':
+                                  sim_upgrades: bool, index=None) -> 'AgingRate':
         """
         Sequential Drill-Down Lookup:
         1. PAA/UTE (Exact)
-        2. IP Qty (Closest)
-        3. Exp Ratio (Closest)
+        2. Exp Ratio (Closest)
+        3. IP Qty (Closest)
         4. Total Pilots (Closest)
         5. Student Counts (Distance Tie-Breaker)
+
+        index: an AgingRateIndex over original_df / stud_matrix picks the same row
+        without scanning the whole table.
         """
         # --- 0. Handle Non-Upgrade Logic ---
         # If upgrades are OFF, we force the target student counts to 0.
@@ -292,54 +614,16 @@ class SquadronConfig:
         else:
             current_stud_params = {c: 0 for c in stud_cols}
 
-        # --- 1. Environmental Lock (Exact Match) ---
-        target_paa = params.get('paa')
-        target_ute = params.get('ute')
-        
-        mask = (original_df['paa'].values == target_paa) & (original_df['ute'].values == target_ute)
-        
-        # Safety fallback
-        if not np.any(mask):
-            mask = np.ones(len(original_df), dtype=bool)
-
-        # --- 2. Sequential Soft Locks (The "Drill Down") ---
-        # We define the priority order of variables to lock down
-        priority_vars = ['exp_ratio', 'ip_qty', 'total_pilots']
-        
-        for var in priority_vars:
-            target_val = params.get(var, 0)
-            # Get values only from the currently surviving rows
-            valid_values = original_df[var].values[mask]
-            
-            if len(valid_values) > 0:
-                # Find the smallest difference available in the current subset
-                min_diff = np.min(np.abs(valid_values - target_val))
-                
-                # Update mask: Keep only rows that are this close to the target
-                # We use a small epsilon for float comparison safety on exp_ratio
-                is_closest = np.abs(original_df[var].values - target_val) <= (min_diff + 0.00001)
-                
-                # Intersect with current mask
-                mask = mask & is_closest
-
-        # --- 3. Final Distance Calculation (Student Bottleneck) ---
-        
-        # Start with zero distance (all survivors are considered "equal" on base stats now)
-        dists = np.zeros(len(original_df))
-        
-        # Add Student Distance (using the 0-forced values if sim_upgrades=False)
+        norm_input_stud = None
         if stud_matrix is not None:
             input_stud = np.array([current_stud_params.get(c, 0) for c in stud_cols])
             norm_input_stud = input_stud / stud_std
-            
-            # Calculate distance only on student columns
-            dists += np.sum((stud_matrix - norm_input_stud)**2, axis=1)
 
-        # --- 4. Apply Mask & Pick Winner ---
-        # Set non-survivors to infinity
-        dists[~mask] = np.inf
-        
-        closest_idx = np.argmin(dists)
+        # --- 1-4. PAA/UTE lock, drill-down and student distance (see src.lookup_index) ---
+        if index is not None:
+            closest_idx = index.closest_row(params, norm_input_stud)
+        else:
+            closest_idx = scan_closest_row(original_df, stud_matrix, params, norm_input_stud)
         closest_row = original_df.iloc[closest_idx]
 
         if params.get('exp_ratio', 1.0) < 0.30:
@@ -367,28 +651,19 @@ class SquadronConfig:
 # --------------------------------------------------------------------------
     # AI PREDICTION ENGINE
     # --------------------------------------------------------------------------
-    def predict_aging_rate(self, brain: dict) -> AgingRate:
+    def rate_features(self) -> List[float]:
         """
-        Uses the trained Random Forest models (brain) to predict sortie rates
-        based on the current squadron state.
-        
-        Args:
-            brain: Dictionary containing the trained sklearn models 
-                   (wg_monthly, fl_monthly, ip_monthly, etc.)
+        Brain input vector for the current squadron state, in RATE_FEATURES order.
         """
-        # 1. CALCULATE INPUTS (Must match training order EXACTLY)
-        # Features: ['paa', 'ute', 'exp_ratio', 'total_pilots', 'mqt_count', 'flug_count', 'ipug_count', 'ip_qty']
-        
         # Count active students
-        mqt_count = len([p for p in self.pilots if p.upgrade == Upgrade.MQT])
-        flug_count = len([p for p in self.pilots if p.upgrade == Upgrade.FLUG])
-        ipug_count = len([p for p in self.pilots if p.upgrade == Upgrade.IPUG])
+        mqt_count = self.pilots.count(upgrade=Upgrade.MQT, active=None)
+        flug_count = self.pilots.count(upgrade=Upgrade.FLUG, active=None)
+        ipug_count = self.pilots.count(upgrade=Upgrade.IPUG, active=None)
         
         # Ensure we are using Line Pilots (Cockpit Strength)
-        line_pilots = len([p for p in self.pilots if p.current_assignment == Assignment.LINE])
+        line_pilots = self.pilots.count(assignment=Assignment.LINE, active=None)
         
-        # Construct Input Vector (2D Array for sklearn)
-        input_vector = np.array([[
+        return [
             self.paa,
             self.ute,
             self.experience_ratio,
@@ -397,21 +672,39 @@ class SquadronConfig:
             flug_count,
             ipug_count,
             self.ip_qty
-        ]])
+        ]
+
+    def predict_aging_rate(self, brain: dict, cache: Optional[RateCache] = None) -> AgingRate:
+        """
+        Uses the trained Random Forest models (brain) to predict sortie rates
+        based on the current squadron state.
+        
+        Args:
+            brain: Dictionary containing the trained sklearn models 
+                   (wg_monthly, fl_monthly, ip_monthly, etc.)
+            cache: Optional RateCache; the brain is then evaluated at the
+                   quantized state and reused for nearby states.
+        """
+        # 1. CALCULATE INPUTS (Must match training order EXACTLY)
+        # Features: ['paa', 'ute', 'exp_ratio', 'total_pilots', 'mqt_count', 'flug_count', 'ipug_count', 'ip_qty']
+        features = self.rate_features()
 
         # 2. GET PREDICTIONS (Monthly Rates)
         try:
-            wg_mo = brain['wg_monthly'].predict(input_vector)[0]
-            fl_mo = brain['fl_monthly'].predict(input_vector)[0]
-            ip_mo = brain['ip_monthly'].predict(input_vector)[0]
-            
-            # Blue Air Predictions
-            wg_blue_mo = brain['wg_blue_monthly'].predict(input_vector)[0]
-            fl_blue_mo = brain['fl_blue_monthly'].predict(input_vector)[0]
-            ip_blue_mo = brain['ip_blue_monthly'].predict(input_vector)[0]
+            if cache is not None:
+                monthly = cache.get(features, lambda x: predict_monthly_rates(brain, x))
+            else:
+                monthly = predict_monthly_rates(brain, features)
         except KeyError as e:
             print(f"🚨 Brain Missing Model: {e}")
             return AgingRate() # Return empty/zero rate on failure
+        return self.phase_aging_rate(monthly)
+
+    def phase_aging_rate(self, monthly) -> AgingRate:
+        """
+        AgingRate for this squadron from predicted monthly rates (RATE_TARGETS order).
+        """
+        wg_mo, fl_mo, ip_mo, wg_blue_mo, fl_blue_mo, ip_blue_mo = monthly
 
         # 3. CONVERT TO PHASE OUTPUT (Sorties per Phase)
         # The simulation executes in phases (e.g., 1 month), so we scale monthly rate to phase length.
@@ -429,4 +722,26 @@ class SquadronConfig:
             wg_blue_phase=max(0, wg_blue_mo * months_per_phase),
             fl_blue_phase=max(0, fl_blue_mo * months_per_phase),
             ip_blue_phase=max(0, ip_blue_mo * months_per_phase)
-        )
\ No newline at end of file
+        )
+
+# ----------------------
+# Batched Rate Prediction
+# ----------------------
+def predict_aging_rates(squadrons: List[SquadronConfig], brain: dict,
+                        cache: Optional[RateCache] = None) -> List[AgingRate]:
+    """
+    SquadronConfig.predict_aging_rate for every squadron, with one predict call
+    per brain model on the stacked feature matrix instead of one per squadron.
+    """
+    if not squadrons:
+        return []
+    features = np.array([sq.rate_features() for sq in squadrons], dtype=float)
+    try:
+        if cache is not None:
+            monthly = cache.get_many(features, lambda X: predict_monthly_rates(brain, X))
+        else:
+            monthly = predict_monthly_rates(brain, features)
+    except KeyError as e:
+        print(f"🚨 Brain Missing Model: {e}")
+        return [AgingRate() for _ in squadrons] # Return empty/zero rate on failure
+    return [sq.phase_aging_rate(rates) for sq, rates in zip(squadrons, monthly)]
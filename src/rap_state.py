@@ -1,5 +1,21 @@
 from src.models import Qual, Upgrade
 
+# Group: (monthly sorties required, RAP state bit)
+RAP_REQUIREMENTS = {
+    "MQT": (0, 0),
+    "WG": (9, 1),
+    "FL": (8, 2),
+    "IP": (8, 4),
+}
+
+def rap_group_entries(group_name, avg_sorties, avg_blue_sorties, avg_red_sorties):
+    rap_req, bit_mask = RAP_REQUIREMENTS[group_name]
+
+    rap_entry = [bit_mask if avg_sorties < rap_req else 0, avg_sorties] # rap_dict["WG"] = [1, 9.5]
+    blue_entry = [bit_mask if avg_blue_sorties < rap_req else 0, avg_blue_sorties] # blue_rap_dict["FL"] = [2, 9.5]
+    red_entry = [avg_red_sorties / avg_sorties if avg_sorties > 0 else 0, avg_red_sorties] # red_dict["WG"] = [45.5, 4.5]
+    return rap_entry, blue_entry, red_entry
+
 def rap_assess(pilots):
     groups = {
         "MQT": [p for p in pilots if p.upgrade == Upgrade.MQT],
@@ -23,18 +39,9 @@ def rap_assess(pilots):
         avg_blue_sorties = sum(p.sortie_blue_monthly for p in group_pilots) / len(group_pilots)
         avg_red_sorties = sum(p.sortie_red_monthly for p in group_pilots) / len(group_pilots)
 
-        if group_name == "WG":
-            rap_req, bit_mask = 9, 1
-        elif group_name == "FL":
-            rap_req, bit_mask = 8, 2
-        elif group_name == "IP":
-            rap_req, bit_mask = 8, 4
-        elif group_name == "MQT":
-            rap_req, bit_mask = 0, 0
-
-        rap_dict[group_name] = [bit_mask if avg_sorties < rap_req else 0, avg_sorties] # rap_dict["WG"] = [1, 9.5]
-        blue_rap_dict[group_name] = [bit_mask if avg_blue_sorties < rap_req else 0, avg_blue_sorties] # blue_rap_dict["FL"] = [2, 9.5]
-        red_dict[group_name] = [avg_red_sorties / avg_sorties if avg_sorties > 0 else 0, avg_red_sorties] # red_dict["WG"] = [45.5, 4.5]
+        rap_dict[group_name], blue_rap_dict[group_name], red_dict[group_name] = rap_group_entries(
+            group_name, avg_sorties, avg_blue_sorties, avg_red_sorties
+        )
 
     return rap_dict, blue_rap_dict, red_dict
 
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import numpy as np
+
+# ----------------------
+# Rate Predictor Inputs
+# ----------------------
+# Brain feature order (train_brain_lite.py / rap_predictor_2.py) and its targets
+RATE_FEATURES = ['paa', 'ute', 'exp_ratio', 'total_pilots', 'mqt_qty', 'flug_qty', 'ipug_qty', 'ip_qty']
+RATE_TARGETS = ['wg_monthly', 'fl_monthly', 'ip_monthly', 'wg_blue_monthly', 'fl_blue_monthly', 'ip_blue_monthly']
+
+# sortie_brain.pkl layouts:
+#   1 (untagged): {target: model} with one single-output model per RATE_TARGETS entry
+#   2: {"version": 2, "features": RATE_FEATURES, "targets": RATE_TARGETS,
+#       "model": one multi-output model predicting every target (columns in "targets" order)}
+BRAIN_VERSION = 2
+
+# Step per feature; features not listed are matched exactly. exp_ratio moves by
+# 1/line_pilots as squadrons gain and lose pilots, so nearly every query misses
+# unless it is rounded.
+DEFAULT_QUANTIZATION = {'exp_ratio': 0.01}
+
+# ----------------------
+# Rate Cache
+# ----------------------
+class RateCache:
+    """
+    Bounded LRU cache of monthly rate predictions, keyed on the quantized
+    RATE_FEATURES vector.
+
+    A miss evaluates the predictor at the quantized vector (not the query), so a
+    cached rate does not depend on which squadron asked first and runs sharing a
+    cache stay reproducible. Share one cache between CAFSimulation replicates in a
+    process; only share it between simulations that use the same brain.
+    """
+    def __init__(self, maxsize: int = 65536, quantization: Optional[Dict[str, float]] = None):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, got {maxsize}")
+        quantization = DEFAULT_QUANTIZATION if quantization is None else quantization
+        unknown = set(quantization) - set(RATE_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown rate features {sorted(unknown)}; expected {RATE_FEATURES}")
+        if any(step <= 0 for step in quantization.values()):
+            raise ValueError(f"Quantization steps must be positive, got {quantization}")
+
+        self.maxsize = maxsize
+        self.quantization = dict(quantization)
+        self._steps = np.array([quantization.get(f, 0.0) for f in RATE_FEATURES], dtype=float)
+        self._rounded = self._steps > 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, features) -> tuple:
+        """
+        Cache key of a RATE_FEATURES vector: rounded features as step counts,
+        the rest as exact floats.
+        """
+        values = np.asarray(features, dtype=float)
+        key = values.copy()
+        key[self._rounded] = np.round(values[self._rounded] / self._steps[self._rounded])
+        return tuple(key.tolist())
+
+    def get(self, features, predict: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        Monthly rates (RATE_TARGETS order) for a RATE_FEATURES vector;
+        predict(vector) fills misses.
+        """
+        key = self.quantize(features)
+        rates = self._entries.get(key)
+        if rates is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rates
+
+        self.misses += 1
+        rates = np.asarray(predict(self._points([key])[0]), dtype=float)
+        self._insert(key, rates)
+        return rates
+
+    def get_many(self, features, predict: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        get() for each row of a feature matrix: all misses go to predict(matrix)
+        in one call. Counters and LRU order end up as if the rows were looked up
+        one at a time.
+        """
+        keys = [self.quantize(row) for row in np.asarray(features, dtype=float)]
+        missing = list(dict.fromkeys(k for k in keys if k not in self._entries))
+        new = {}
+        if missing:
+            new = dict(zip(missing, np.asarray(predict(self._points(missing)), dtype=float)))
+
+        rows = []
+        for key in keys:
+            rates = self._entries.get(key)
+            if rates is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                if key not in new:  # evicted earlier in this batch (maxsize below the batch size)
+                    new[key] = np.asarray(predict(self._points([key])), dtype=float)[0]
+                rates = new[key]
+                self.misses += 1
+                self._insert(key, rates)
+            rows.append(rates)
+        return np.array(rows).reshape(len(keys), len(RATE_TARGETS))
+
+    def _points(self, keys: list) -> np.ndarray:
+        # Quantized keys back to feature vectors (the points the predictor sees)
+        points = np.array(keys, dtype=float)
+        points[:, self._rounded] *= self._steps[self._rounded]
+        return points
+
+    def _insert(self, key: tuple, rates: np.ndarray):
+        self._entries[key] = rates
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "size": len(self._entries), "maxsize": self.maxsize,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """
+        Drops all entries and resets the counters.
+        """
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
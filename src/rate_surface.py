@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from src.rate_cache import RATE_FEATURES, RATE_TARGETS, BRAIN_VERSION
+
+# ----------------------
+# Tabulated Rate Surface
+# ----------------------
+MAX_SURFACE_POINTS = 50_000_000  # grid points; each holds len(RATE_TARGETS) float64 rates
+
+def _axes_path(path: str) -> str:
+    # rate_surface.npy -> rate_surface.axes.json (grid axes saved next to the tensor)
+    return os.path.splitext(path)[0] + ".axes.json"
+
+class RateSurface:
+    """
+    Monthly rates (RATE_TARGETS) tabulated on a grid over RATE_FEATURES and
+    answered by multilinear interpolation, so the simulation needs no sklearn.
+
+    values has shape [len(axes[f]) for f in RATE_FEATURES] + [len(RATE_TARGETS)].
+    Queries outside an axis are clamped to its end values (a forest is flat
+    beyond its training data too). predict(X) has the sklearn signature, so
+    as_brain() plugs a surface in wherever a multi-output brain is used.
+    """
+    def __init__(self, axes: Dict[str, np.ndarray], values: np.ndarray):
+        if list(axes) != RATE_FEATURES:
+            raise ValueError(f"Surface axes must be {RATE_FEATURES}, got {list(axes)}")
+        self.axes = {name: np.asarray(axis, dtype=float) for name, axis in axes.items()}
+        shape = tuple(len(axis) for axis in self.axes.values()) + (len(RATE_TARGETS),)
+        if values.shape != shape:
+            raise ValueError(f"Surface values have shape {values.shape}; the axes need {shape}")
+        for name, axis in self.axes.items():
+            if len(axis) == 0 or np.any(np.diff(axis) <= 0):
+                raise ValueError(f"Surface axis {name} must be non-empty and strictly increasing")
+        self.values = values
+
+        # Flat offsets of the 2^d cell corners, in C order over the axes (axes of
+        # length 1 contribute a zero step, so both "corners" are the same point)
+        sizes = [len(axis) for axis in self.axes.values()]
+        strides = np.cumprod([1] + sizes[:0:-1])[::-1]
+        self._strides = strides
+        steps = [np.array([0, stride if size > 1 else 0]) for size, stride in zip(sizes, strides)]
+        self._corners = sum(np.ix_(*steps)).ravel()
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Monthly rates, one row per RATE_FEATURES row of X (all rows in one
+        vectorized pass).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        base = np.zeros(len(X), dtype=np.int64)
+        fracs = []
+        for k, axis in enumerate(self.axes.values()):
+            x = np.clip(X[:, k], axis[0], axis[-1])
+            if len(axis) == 1:
+                i, t = np.zeros(len(X), dtype=np.int64), np.zeros(len(X))
+            else:
+                i = np.clip(np.searchsorted(axis, x, side="right") - 1, 0, len(axis) - 2)
+                t = (x - axis[i]) / (axis[i + 1] - axis[i])
+            base += i * self._strides[k]
+            fracs.append(t)
+
+        flat = self.values.reshape(-1, len(RATE_TARGETS))
+        v = flat[base[:, None] + self._corners[None, :]]  # (n, 2^d, targets)
+        v = v.reshape((len(X),) + (2,) * len(fracs) + (len(RATE_TARGETS),))
+        # Collapse one axis at a time: lerp between its low and high corner
+        for t in fracs:
+            t = t.reshape((-1,) + (1,) * (v.ndim - 2))
+            v = v[:, 0] * (1 - t) + v[:, 1] * t
+        return v
+
+    def as_brain(self) -> dict:
+        """
+        The surface in the version BRAIN_VERSION sortie brain layout.
+        """
+        return {"version": BRAIN_VERSION, "features": RATE_FEATURES, "targets": RATE_TARGETS, "model": self}
+
+    def save(self, path: str):
+        """
+        Writes the rate tensor to path (.npy) and the axes to <path stem>.axes.json.
+        """
+        np.save(path, self.values)
+        with open(_axes_path(path), "w") as f:
+            json.dump({"features": RATE_FEATURES, "targets": RATE_TARGETS,
+                       "axes": {name: axis.tolist() for name, axis in self.axes.items()}}, f, indent=1)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "RateSurface":
+        with open(_axes_path(path)) as f:
+            meta = json.load(f)
+        if meta["features"] != RATE_FEATURES or meta["targets"] != RATE_TARGETS:
+            raise ValueError(f"{path} tabulates {meta['features']} -> {meta['targets']}; "
+                             f"expected {RATE_FEATURES} -> {RATE_TARGETS}")
+        return cls(meta["axes"], np.load(path, mmap_mode="r" if mmap else None))
+
+    # ----------------------
+    # Builders
+    # ----------------------
+    @classmethod
+    def from_brain(cls, brain: dict, axes: Dict[str, list], chunk_size: int = 262144) -> "RateSurface":
+        """
+        Evaluates a sortie brain (either layout) at every grid point of axes.
+        """
+        from src.models import predict_monthly_rates  # avoids a models <-> surface import cycle
+
+        axes = _check_grid(axes)
+        shape = tuple(len(axis) for axis in axes.values())
+        values = np.empty((int(np.prod(shape)), len(RATE_TARGETS)))
+        for first in range(0, len(values), chunk_size):
+            idx = np.unravel_index(np.arange(first, min(first + chunk_size, len(values))), shape)
+            X = np.column_stack([axis[i] for axis, i in zip(axes.values(), idx)])
+            values[first:first + len(X)] = predict_monthly_rates(brain, X)
+        return cls(axes, values.reshape(shape + (len(RATE_TARGETS),)))
+
+    @classmethod
+    def from_table(cls, df: pd.DataFrame, axes: Optional[Dict[str, list]] = None) -> "RateSurface":
+        """
+        Tabulates a sweep results table directly. axes default to the distinct
+        values of each feature column; rows on the same grid point (replicates)
+        are averaged and rows off the grid are ignored. Grid points without rows
+        (infeasible configs) take the mean of their filled neighbours, spreading
+        outward until every point has a value.
+        """
+        missing = [c for c in RATE_FEATURES + RATE_TARGETS if c not in df.columns]
+        if missing:
+            raise ValueError(f"Table is missing columns {missing}")
+        if axes is None:
+            axes = {name: np.unique(df[name].dropna().values) for name in RATE_FEATURES}
+        axes = _check_grid(axes)
+        shape = tuple(len(axis) for axis in axes.values())
+
+        on_grid = np.ones(len(df), dtype=bool)
+        idx = []
+        for name, axis in axes.items():
+            col = df[name].values.astype(float)
+            i = np.clip(np.searchsorted(axis, col), 0, len(axis) - 1)
+            on_grid &= axis[i] == col
+            idx.append(i)
+        flat = np.ravel_multi_index([i[on_grid] for i in idx], shape)
+        targets = df[RATE_TARGETS].values.astype(float)[on_grid]
+        if not len(flat):
+            raise ValueError("No table rows lie on the surface grid")
+
+        sums = np.zeros((int(np.prod(shape)), len(RATE_TARGETS)))
+        counts = np.zeros(len(sums))
+        np.add.at(sums, flat, targets)
+        np.add.at(counts, flat, 1)
+        with np.errstate(invalid="ignore"):
+            values = sums / counts[:, None]
+        return cls(axes, _fill_missing(values.reshape(shape + (len(RATE_TARGETS),)), counts.reshape(shape) > 0))
+
+def _check_grid(axes: Dict[str, list]) -> Dict[str, np.ndarray]:
+    # Grid axes in RATE_FEATURES order, within MAX_SURFACE_POINTS
+    if set(axes) != set(RATE_FEATURES):
+        raise ValueError(f"Surface grid must set exactly {RATE_FEATURES}, got {sorted(axes)}")
+    axes = {name: np.unique(np.asarray(axes[name], dtype=float)) for name in RATE_FEATURES}
+    points = int(np.prod([len(axis) for axis in axes.values()], dtype=np.float64))
+    if points > MAX_SURFACE_POINTS:
+        raise ValueError(f"Surface grid has {points} points (limit {MAX_SURFACE_POINTS}); use coarser axes")
+    return axes
+
+def _fill_missing(values: np.ndarray, known: np.ndarray) -> np.ndarray:
+    # Each pass fills every empty point that has a filled neighbour along some axis
+    values = np.where(known[..., None], values, 0.0)
+    while not known.all():
+        total = np.zeros_like(values)
+        count = np.zeros(known.shape)
+        for k in range(known.ndim):
+            for shift in (1, -1):
+                src = [slice(None)] * known.ndim
+                dst = [slice(None)] * known.ndim
+                src[k] = slice(None, -1) if shift == 1 else slice(1, None)
+                dst[k] = slice(1, None) if shift == 1 else slice(None, -1)
+                src, dst = tuple(src), tuple(dst)
+                total[dst] += values[src] * known[src][..., None]
+                count[dst] += known[src]
+        grow = ~known & (count > 0)
+        values[grow] = total[grow] / count[grow][:, None]
+        known = known | grow
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tabulate the sortie brain (or a sweep table) as a rate surface.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--brain", help="sortie brain .pkl to evaluate on the grid")
+    source.add_argument("--table", help="sweep results (Parquet file or dataset directory) to tabulate")
+    parser.add_argument("--spec", help="sweep spec whose grid is the surface grid (default: SWEEP_GRID; "
+                                       "with --table, the table's own values)")
+    parser.add_argument("--out", default="outputs/rate_surface.npy")
+    args = parser.parse_args()
+
+    axes = None
+    if args.spec or args.brain:
+        from src import research_sweeper  # grid definition only needed to build
+        if args.spec:
+            research_sweeper.apply_sweep_spec(research_sweeper.load_sweep_spec(args.spec))
+        axes = dict(research_sweeper.SWEEP_GRID)
+
+    if args.brain:
+        import joblib
+        from src.models import check_brain
+        surface = RateSurface.from_brain(check_brain(joblib.load(args.brain)), axes)
+    else:
+        surface = RateSurface.from_table(pd.read_parquet(args.table), axes)
+    surface.save(args.out)
+    print(f"Saved {surface.values.shape[:-1]} rate surface to {args.out}")
@@ -1,110 +1,717 @@
-import pandas as pd
 import numpy as np
 import os
-from src.engine import run_phase_simulation, create_pilots
+import json
+import time
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from src.engine import run_phase_simulation, create_pilots, add_stage_time
+from src import vector_engine
+from src.batch_engine import run_phase_batch
 from src.models import SquadronConfig, Qual, Upgrade
 from src.rap_state import rap_assess, rap_state_code, rap_state_label
+from src.sweep_output import ParquetSweepWriter, SweepManifest, SweepTelemetry, MANIFEST_NAME, TELEMETRY_NAME, sweep_schema
 
-def run_research_sweep(average_iterations=True):
-    # --- RANGES ---
-    ute_values = list(range(6, 21))
-    ip_qty_values = list(range(3, 8))
-    exp_ratios = [0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7]
-    paa_values = [18, 21, 24]
-    mqt_students = [0, 2, 4, 6, 8, 10]
-    flug_students = [0, 2, 4, 6, 8, 10]
-    ipug_students = [0, 2, 4, 6, 8, 10]
-    total_pilots = [25, 30, 35, 40]
-
-    PHASE_DAYS = 120
-    ITERATIONS_PER_CONFIG = 3 
-    OUTPUT_FILE = "outputs/research_data.csv"
-
-    # 1. PREPARE THE FILE (Header includes total_capacity now)
+SWEEP_COLUMNS = [
+    "paa", "ute", "total_capacity", "exp_ratio", "ip_qty", "total_pilots", 
+    "mqt_qty", "flug_qty", "ipug_qty", "rap_state_code", "rap_state_label", 
+    "blue_rap_state_code", "blue_rap_state_label", "mqt_monthly", "wg_monthly", 
+    "fl_monthly", "ip_monthly", "wg_blue_monthly", "fl_blue_monthly", 
+    "ip_blue_monthly", "wg_red_monthly", "fl_red_monthly", "ip_red_monthly", 
+    "wg_red_pct", "fl_red_pct", "ip_red_pct"
+]
+# Simulated outputs; averaged sweeps also get a "<metric>_std" column for each
+SWEEP_METRICS = [c for c in SWEEP_COLUMNS[SWEEP_COLUMNS.index("rap_state_code"):] if not c.endswith("_label")]
+SWEEP_STD_COLUMNS = [f"{c}_std" for c in SWEEP_METRICS]
+CI_METRICS = [c for c in SWEEP_METRICS if c.endswith("_monthly")]  # replicates stop once these are tight
+
+def sweep_columns(average_iterations: bool) -> list:
+    columns = SWEEP_COLUMNS + SWEEP_STD_COLUMNS if average_iterations else list(SWEEP_COLUMNS)
+    return columns + ["replicates"]
+
+# --- RANGES --- (swept in this order; the last key varies fastest)
+SWEEP_GRID = {
+    "paa": [18, 21, 24],
+    "ute": list(range(6, 21)),
+    "ip_qty": list(range(3, 8)),
+    "exp_ratio": [0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7],
+    "mqt_qty": [0, 2, 4, 6, 8, 10],
+    "flug_qty": [0, 2, 4, 6, 8, 10],
+    "ipug_qty": [0, 2, 4, 6, 8, 10],
+    "total_pilots": [25, 30, 35, 40],
+}
+
+PHASE_DAYS = 120
+ALLOCATION_NOISE = 0.0  # 0 makes every engine deterministic: one replicate per config
+COUNT_SIMS = False      # True: syllabus SIM events are sims, not sorties (engine count_sims)
+MAX_REPLICATES = 20
+CI_WIDTH = 0.5          # target 95% confidence interval width on CI_METRICS (sorties/month)
+OUTPUT_FILE = "outputs/simulation_results.parquet"  # Parquet dataset directory
+SHARDS_DIR = "outputs/simulation_results.shards"   # one dataset directory per shard until merged
+
+# Adaptive mode: same columns plus the refinement level each config was added at
+ADAPTIVE_OUTPUT_FILE = "outputs/simulation_results_adaptive.parquet"
+REFINE_METRICS = ["wg_monthly", "fl_monthly", "ip_monthly"]
+REFINE_AXES = ["ute"]
+
+def _total_capacity(paa, ute, phase_days):
+    return paa * ute * (phase_days / 30)
+
+def _config_columns(cfg: SquadronConfig) -> dict:
+    return {
+        "paa": cfg.paa, "ute": cfg.ute, 
+        "total_capacity": _total_capacity(cfg.paa, cfg.ute, cfg.phase_length_days),
+        "exp_ratio": cfg.experience_ratio, "ip_qty": cfg.ip_qty, "total_pilots": cfg.total_pilots,
+        "mqt_qty": cfg.mqt_students, "flug_qty": cfg.flug_students, "ipug_qty": cfg.ipug_students,
+    }
+
+# ----------------------
+# Replicate Aggregation
+# ----------------------
+# Two-sided 95% Student t critical values by degrees of freedom (normal beyond 30)
+_T_975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+          2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+          2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+class RunningStats:
+    """
+    Welford running mean and variance, plus min and max, over equal-length value
+    vectors (one per replicate), without keeping the replicates.
+    """
+    def __init__(self, size: int):
+        self.n = 0
+        self.mean = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self._m2 = np.zeros(size)
+
+    def add(self, values):
+        x = np.asarray(values, dtype=np.float64)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+        np.minimum(self.min, x, out=self.min)
+        np.maximum(self.max, x, out=self.max)
+
+    def std(self) -> np.ndarray:
+        # Sample standard deviation; NaN below two replicates
+        if self.n < 2:
+            return np.full(len(self.mean), np.nan)
+        return np.sqrt(self._m2 / (self.n - 1))
+
+    def ci_width(self) -> np.ndarray:
+        # Width of the 95% confidence interval on the mean; inf below two replicates
+        if self.n < 2:
+            return np.full(len(self.mean), np.inf)
+        t = _T_975[self.n - 2] if self.n - 1 <= len(_T_975) else 1.96
+        return 2 * t * self.std() / np.sqrt(self.n)
+
+def _batch_rows(configs, results, average_iterations: bool = False) -> list:
+    """
+    Converts run_phase_batch output into each config's sweep rows ([] if infeasible).
+    Averaged rows get zero std columns: the batch engine is deterministic.
+    """
+    rows = []
+    for cfg, res in zip(configs, results):
+        if not res["feasible"]:
+            rows.append([])
+            continue
+        r_code = int(res["rap_state_code"])
+        b_code = int(res["blue_rap_state_code"])
+        row = _config_columns(cfg)
+        row.update({
+            "rap_state_code": r_code, "rap_state_label": rap_state_label(r_code),
+            "blue_rap_state_code": b_code, "blue_rap_state_label": rap_state_label(b_code),
+        })
+        for col in SWEEP_COLUMNS:
+            if col not in row:
+                row[col] = float(res[col])
+        if average_iterations:
+            row.update(dict.fromkeys(SWEEP_STD_COLUMNS, 0.0))
+        row["replicates"] = 1
+        rows.append([row])
+    return rows
+
+def _make_config(params) -> SquadronConfig:
+    paa, ute, ip_q, exp, mqt, flug, ipug, total = params
+    cfg = SquadronConfig(
+        paa=paa, ute=ute, ip_qty=ip_q,
+        mqt_students=mqt, flug_students=flug, ipug_students=ipug,
+        phase_length_days=PHASE_DAYS
+    )
+    cfg.total_pilots = total
+    cfg.experience_ratio = exp
+    return cfg
+
+def _simulate_config(cfg: SquadronConfig, backend: str, average_iterations: bool, timings: dict = None) -> list:
+    """
+    Runs replicates of one config until the 95% confidence interval on every
+    CI_METRICS output is at most CI_WIDTH wide, all replicates so far are identical,
+    or MAX_REPLICATES is reached. With ALLOCATION_NOISE = 0 the engines are
+    deterministic, so one replicate is exact.
+
+    Returns its output rows (one averaged row, or one per replicate), each with
+    the replicate count; infeasible configs return []. Averaging streams the
+    replicates through RunningStats (mean and std columns). Stage seconds are
+    added to timings, if given.
+    """
+    config_results = []
+    stats = RunningStats(len(SWEEP_METRICS))
+    ci = [SWEEP_METRICS.index(c) for c in CI_METRICS]
+    for i in range(1 if ALLOCATION_NOISE == 0 else MAX_REPLICATES):
+        try:
+            if backend == "numpy":
+                state = vector_engine.run_phase_simulation(cfg, allocation_noise=ALLOCATION_NOISE, count_sims=COUNT_SIMS,
+                                                           timings=timings)
+                start = time.perf_counter()
+                rap_dict, blue_rap_dict, red_dict = vector_engine.rap_assess(state)
+            else:
+                start = time.perf_counter()
+                pilots = create_pilots(cfg)
+                add_stage_time(timings, "pilot_creation", start)
+                final_pilots = run_phase_simulation(cfg, pilots, allocation_noise=ALLOCATION_NOISE,
+                                                    backend="numba" if backend == "numba" else "python", timings=timings,
+                                                    count_sims=COUNT_SIMS)
+                start = time.perf_counter()
+                rap_dict, blue_rap_dict, red_dict = rap_assess(final_pilots)
+            add_stage_time(timings, "rap_assess", start)
+
+            r_code = rap_state_code(rap_dict)
+            b_code = rap_state_code(blue_rap_dict)
+
+            current_result = {
+                **_config_columns(cfg),
+                "rap_state_code": r_code, "rap_state_label": rap_state_label(r_code),
+                "blue_rap_state_code": b_code, "blue_rap_state_label": rap_state_label(b_code),
+                "mqt_monthly": rap_dict["MQT"][1], "wg_monthly": rap_dict["WG"][1],
+                "fl_monthly": rap_dict["FL"][1], "ip_monthly": rap_dict["IP"][1],
+                "wg_blue_monthly": blue_rap_dict["WG"][1], 
+                "fl_blue_monthly": blue_rap_dict["FL"][1], 
+                "ip_blue_monthly": blue_rap_dict["IP"][1],
+                "wg_red_monthly": red_dict["WG"][1], 
+                "fl_red_monthly": red_dict["FL"][1], 
+                "ip_red_monthly": red_dict["IP"][1], 
+                "wg_red_pct": red_dict["WG"][0], 
+                "fl_red_pct": red_dict["FL"][0], 
+                "ip_red_pct": red_dict["IP"][0]
+            }
+        except ValueError:
+            break
+        stats.add([current_result[c] for c in SWEEP_METRICS])
+        if not average_iterations:
+            config_results.append(current_result)
+        if (stats.n > 1 and (stats.min == stats.max).all()) or (stats.ci_width()[ci] <= CI_WIDTH).all():
+            break
+
+    # --- AGGREGATION ---
+    if average_iterations and stats.n:
+        row = _config_columns(cfg)
+        row.update(zip(SWEEP_METRICS, stats.mean.tolist()))
+        row.update(zip(SWEEP_STD_COLUMNS, (stats.std() if ALLOCATION_NOISE else np.zeros(len(SWEEP_METRICS))).tolist()))
+        row["rap_state_label"] = rap_state_label(int(round(row["rap_state_code"])))
+        row["blue_rap_state_label"] = rap_state_label(int(round(row["blue_rap_state_code"])))
+        config_results = [row]
+    for row in config_results:
+        row["replicates"] = stats.n
+    return config_results
+
+def _run_chunk(chunk: list, backend: str, average_iterations: bool, batch_size: int) -> tuple:
+    """
+    Worker task: simulates a chunk of grid points (SWEEP_GRID value tuples).
+    Returns each one's output rows, in grid order, and {stage: seconds} for the
+    chunk, with its total run time under "busy".
+    """
+    start = time.perf_counter()
+    timings = {}
+    configs = [_make_config(params) for params in chunk]
+    rows = []
+    if backend == "batch":
+        for first in range(0, len(configs), batch_size):
+            part = configs[first:first + batch_size]
+            rows.extend(_batch_rows(part, run_phase_batch(part, timings, COUNT_SIMS), average_iterations))
+    else:
+        for cfg in configs:
+            rows.append(_simulate_config(cfg, backend, average_iterations, timings))
+    add_stage_time(timings, "busy", start)
+    return rows, timings
+
+def _grid_shape() -> tuple:
+    return tuple(len(v) for v in SWEEP_GRID.values())
+
+def _grid_axis(name: str) -> np.ndarray:
+    # SWEEP_GRID[name] shaped to broadcast along its own axis of the grid
+    k = list(SWEEP_GRID).index(name)
+    return np.asarray(SWEEP_GRID[name]).reshape([-1 if i == k else 1 for i in range(len(SWEEP_GRID))])
+
+def grid_feasibility() -> tuple:
+    """
+    engine.pilot_counts evaluated over the whole grid at once. Returns the feasible
+    mask over the flat grid index and {check: configs pruned by it}; each config is
+    charged to the first check it fails, in pilot_counts order.
+    """
+    shape = _grid_shape()
+    total = _grid_axis("total_pilots")
+    experienced = np.floor(total * _grid_axis("exp_ratio")).astype(np.int64)  # int() truncation
+    wg = total - experienced
+
+    checks = {
+        "experienced > total_pilots": experienced > total,
+        "ip_qty > experienced": _grid_axis("ip_qty") > experienced,
+        "mqt_qty + flug_qty > WG count": _grid_axis("mqt_qty") + _grid_axis("flug_qty") > wg,
+    }
+    feasible = np.ones(shape, dtype=bool)
+    pruned = {}
+    for check, fails in checks.items():
+        fails = np.broadcast_to(fails, shape) & feasible
+        pruned[check] = int(fails.sum())
+        feasible &= ~fails
+    return feasible.ravel(), pruned
+
+def capacity_sources() -> np.ndarray:
+    """
+    For each flat grid index, the first grid point that differs from it at most in
+    paa/ute and has the same phase capacity, int(ute * paa * months). The engines
+    only see paa and ute through that capacity, so both give identical results.
+    """
+    shape = _grid_shape()
+    names = list(SWEEP_GRID)
+    kp, ku = names.index("paa"), names.index("ute")
+    stride = [int(np.prod(shape[k + 1:])) for k in range(len(shape))]
+
+    paa = np.asarray(SWEEP_GRID["paa"])[:, None]
+    ute = np.asarray(SWEEP_GRID["ute"])[None, :]
+    capacity = (ute * paa * (PHASE_DAYS / 30.0)).astype(np.int64)  # as engine.run_phase_simulation
+    offset = (np.arange(shape[kp])[:, None] * stride[kp] + np.arange(shape[ku])[None, :] * stride[ku]).ravel()
+
+    _, cls = np.unique(capacity.ravel(), return_inverse=True)
+    first = np.full(cls.max() + 1, offset.max())
+    np.minimum.at(first, cls, offset)
+    shift = (first[cls] - offset).reshape(capacity.shape)
+
+    paa_i = np.arange(shape[kp]).reshape([-1 if k == kp else 1 for k in range(len(shape))])
+    ute_i = np.arange(shape[ku]).reshape([-1 if k == ku else 1 for k in range(len(shape))])
+    return (np.arange(int(np.prod(shape))).reshape(shape) + shift[paa_i, ute_i]).ravel()
+
+def _fan_out(results, copies: np.ndarray, sources: np.ndarray):
+    """
+    Completes _ordered_results output for chunks of simulated configs: each
+    config's rows are followed by a copy for every config in copies (flat grid
+    indices) whose capacity source it is, with the copy's own paa, ute and
+    total_capacity. Copies go out in their source's chunk, so no rows are held
+    between chunks: memory is one chunk of rows (sources and their copies) plus
+    three int64 arrays over the copied configs, ~24 bytes each (~6 MB for the
+    ~260k copies of the default grid). Rows are therefore grouped by source
+    rather than in strict grid order. Yields (grid indices, rows, chunk timings).
+    """
+    order = np.argsort(sources[copies], kind="stable")
+    targets, target_sources = copies[order], sources[copies][order]
+    paa_values, ute_values = np.array(SWEEP_GRID["paa"], dtype=object), np.array(SWEEP_GRID["ute"], dtype=object)
+    kp, ku = list(SWEEP_GRID).index("paa"), list(SWEEP_GRID).index("ute")
+
+    for (idx, _), (config_rows, timings) in results:
+        first = np.searchsorted(target_sources, idx, side="left")
+        last = np.searchsorted(target_sources, idx, side="right")
+        rows = []
+        for r, a, b in zip(config_rows, first, last):
+            rows.extend(r)
+            if a == b:
+                continue
+            coords = np.unravel_index(targets[a:b], _grid_shape())
+            for paa, ute in zip(paa_values[coords[kp]].tolist(), ute_values[coords[ku]].tolist()):
+                capacity = _total_capacity(paa, ute, PHASE_DAYS)
+                rows.extend({**row, "paa": paa, "ute": ute, "total_capacity": capacity} for row in r)
+        yield np.concatenate([idx] + [targets[a:b] for a, b in zip(first, last) if a < b]), rows, timings
+
+def _grid_chunks(chunk_size: int, todo: np.ndarray = None):
+    """
+    Yields (grid indices, grid points) chunks in grid order for the indices set in
+    todo (a mask over the flat grid index; None = all). Grid points are decoded
+    from the flat index, so the cost scales with the configs left to run.
+    """
+    values = [np.array(v, dtype=object) for v in SWEEP_GRID.values()]
+    todo = np.arange(int(np.prod(_grid_shape()))) if todo is None else np.flatnonzero(todo)
+    for start in range(0, len(todo), chunk_size):
+        idx = todo[start:start + chunk_size]
+        coords = np.unravel_index(idx, _grid_shape())
+        yield idx, list(zip(*(v[c] for v, c in zip(values, coords))))
+
+def _set_sweep_constants(phase_days: int, noise: float, max_replicates: int, ci_width: float, count_sims: bool):
+    # Pool initializer: workers started without fork re-import the module defaults
+    global PHASE_DAYS, ALLOCATION_NOISE, MAX_REPLICATES, CI_WIDTH, COUNT_SIMS
+    PHASE_DAYS, ALLOCATION_NOISE, MAX_REPLICATES, CI_WIDTH = phase_days, noise, max_replicates, ci_width
+    COUNT_SIMS = count_sims
+
+def _ordered_results(chunks, task, workers: int):
+    """
+    Yields (key, task(payload)) for (key, payload) chunks in order. With workers > 1
+    the tasks run in a process pool (at most 2 * workers in flight), but results
+    still come back in submission order, so the output does not depend on the
+    worker count.
+    """
+    if workers <= 1:
+        for key, payload in chunks:
+            yield key, task(payload)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_sweep_constants,
+                             initargs=(PHASE_DAYS, ALLOCATION_NOISE, MAX_REPLICATES, CI_WIDTH, COUNT_SIMS)) as pool:
+        in_flight = deque()
+        for key, payload in chunks:
+            in_flight.append((key, pool.submit(task, payload)))
+            if len(in_flight) >= 2 * workers:
+                key, future = in_flight.popleft()
+                yield key, future.result()
+        while in_flight:
+            key, future = in_flight.popleft()
+            yield key, future.result()
+
+def _sweep_fingerprint(backend: str, average_iterations: bool, shard=None) -> str:
+    return json.dumps({
+        "grid": SWEEP_GRID, "columns": sweep_columns(average_iterations), "phase_days": PHASE_DAYS,
+        "allocation_noise": ALLOCATION_NOISE, "max_replicates": MAX_REPLICATES, "ci_width": CI_WIDTH,
+        "backend": backend, "average_iterations": average_iterations,
+        **({"count_sims": True} if COUNT_SIMS else {}),  # absent when off, so older sweeps still resume
+        **({"shard": list(shard)} if shard is not None else {}),
+    }, sort_keys=True)
+
+# ----------------------
+# Sharding
+# ----------------------
+def parse_shard(text: str) -> tuple:
+    """
+    "k/n" -> (k, n), with 0 <= k < n.
+    """
+    try:
+        k, n = (int(v) for v in text.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like k/n, got {text!r}") from None
+    if not 0 <= k < n:
+        raise ValueError(f"shard {text!r} needs 0 <= k < n")
+    return k, n
+
+def shard_mask(feasible: np.ndarray, k: int, n: int) -> np.ndarray:
+    """
+    Slice k of n of the feasible grid: contiguous in grid order and within one
+    config of the same size for every shard, so it depends only on the grid.
+    """
+    mask = np.zeros_like(feasible)
+    mask[np.array_split(np.flatnonzero(feasible), n)[k]] = True
+    return mask
+
+def _shard_path(k: int, n: int) -> str:
+    return os.path.join(SHARDS_DIR, f"shard-{k:05d}-of-{n:05d}")
+
+def merge_shards(n: int, backend: str = "python", average_iterations: bool = True):
+    """
+    Moves the parts of all n finished shards (same grid and settings) into a fresh
+    OUTPUT_FILE in shard order, which is grid order, with one manifest covering
+    them all (so the merged sweep can be resumed like an unsharded one). Raises
+    ValueError if a shard is missing, incomplete or from a different sweep.
+
+    Only these n shard outputs are removed afterwards; shards of other sweeps (a
+    different n) stay in SHARDS_DIR, which is removed only once it is empty.
+    """
+    if n < 1:
+        raise ValueError(f"need at least one shard to merge, got {n}")
+    grid_size = int(np.prod(_grid_shape()))
+    feasible, _ = grid_feasibility()
+    manifests = []
+    for k in range(n):
+        path = os.path.join(_shard_path(k, n), MANIFEST_NAME)
+        if not os.path.exists(path):
+            raise ValueError(f"shard {k}/{n} has no output at {_shard_path(k, n)}")
+        manifest = SweepManifest.load(path, grid_size, _sweep_fingerprint(backend, average_iterations, (k, n)))
+        if (shard_mask(feasible, k, n) & ~manifest.done).any():
+            raise ValueError(f"shard {k}/{n} is incomplete; resume it before merging")
+        manifests.append(manifest)
+
+    if os.path.exists(OUTPUT_FILE):
+        shutil.rmtree(OUTPUT_FILE) if os.path.isdir(OUTPUT_FILE) else os.remove(OUTPUT_FILE)
+    os.makedirs(OUTPUT_FILE)
+    merged = SweepManifest(os.path.join(OUTPUT_FILE, MANIFEST_NAME), grid_size, _sweep_fingerprint(backend, average_iterations))
+    for k, manifest in enumerate(manifests):
+        for part in manifest.parts:
+            name = f"part-{len(merged.parts):05d}.parquet"
+            os.replace(os.path.join(_shard_path(k, n), part), os.path.join(OUTPUT_FILE, name))
+            merged.parts.append(name)
+        merged.done |= manifest.done
+    merged.commit(None, [])
+    for k in range(n):
+        shutil.rmtree(_shard_path(k, n))
+    if not os.listdir(SHARDS_DIR):
+        os.rmdir(SHARDS_DIR)
+    print(f"Merged {n} shards ({len(merged.parts)} parts) into {OUTPUT_FILE}")
+
+# ----------------------
+# Sweep Specs
+# ----------------------
+# Module settings a spec may set (spec key -> constant), next to "grid"
+SPEC_CONSTANTS = {"phase_days": "PHASE_DAYS", "allocation_noise": "ALLOCATION_NOISE",
+                  "max_replicates": "MAX_REPLICATES", "ci_width": "CI_WIDTH", "count_sims": "COUNT_SIMS"}
+# run_research_sweep settings a spec may set
+SPEC_RUN_KEYS = ["backend", "average_iterations", "batch_size", "chunk_size", "flush_seconds", "dedup_capacity"]
+
+def load_sweep_spec(path: str) -> dict:
+    """
+    Reads a sweep spec from JSON or (with PyYAML installed) YAML, e.g.
+
+        grid:
+          paa: [18, 21, 24]
+          ute: [6, 8, 10, 12]
+          ...                  # every SWEEP_GRID key, each a list of values
+        phase_days: 120
+        allocation_noise: 0.5
+        max_replicates: 20
+        count_sims: false
+        backend: numpy
+    """
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # only needed for YAML specs
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path}: a sweep spec is a mapping")
+    return spec
+
+def apply_sweep_spec(spec: dict) -> dict:
+    """
+    Sets SWEEP_GRID and the SPEC_CONSTANTS from spec; returns its
+    run_research_sweep settings. The grid keeps the SWEEP_GRID axis order.
+    """
+    unknown = set(spec) - {"grid", *SPEC_CONSTANTS, *SPEC_RUN_KEYS}
+    if unknown:
+        raise ValueError(f"Unknown sweep spec keys: {sorted(unknown)}")
+
+    grid = spec.get("grid", SWEEP_GRID)
+    if set(grid) != set(SWEEP_GRID):
+        raise ValueError(f"Spec grid must set exactly {list(SWEEP_GRID)}")
+    if any(not isinstance(v, list) or not v for v in grid.values()):
+        raise ValueError("Spec grid values must be non-empty lists")
+    for name in list(SWEEP_GRID):
+        SWEEP_GRID[name] = grid[name]
+
+    for key, name in SPEC_CONSTANTS.items():
+        if key in spec:
+            globals()[name] = spec[key]
+    return {key: spec[key] for key in SPEC_RUN_KEYS if key in spec}
+
+def run_research_sweep(average_iterations=True, backend="python", batch_size=4096, workers=1, chunk_size=1000,
+                       flush_seconds=300.0, resume=False, dedup_capacity=True, shard=None):
+    """
+    backend: "python" (Pilot objects), "numba" (Pilot objects, compiled allocation
+    kernels), "numpy" (vector_engine arrays, faster) or "batch" (batch_engine,
+    batch_size configs per call; deterministic, so each config is simulated once).
+    At zero ALLOCATION_NOISE every backend gives the same per-pilot counts.
+
+    workers: processes to simulate with; the grid is split into chunk_size-config
+    chunks and this process is the only writer, appending chunks in grid order
+    (capacity copies go out with their source, see dedup_capacity).
+
+    Rows stream into OUTPUT_FILE with sweep_columns(average_iterations); completed
+    parts are readable (pd.read_parquet) at least every flush_seconds while the
+    sweep runs.
+
+    Progress (rates, ETA, per-stage seconds, worker utilization) is appended to
+    TELEMETRY_NAME inside the output as JSON lines (see SweepTelemetry).
+
+    Each part is committed to a manifest of finished grid points. resume=True
+    continues an interrupted sweep with the same settings: finished configs are
+    skipped and new parts are added to the existing output. Without it (or
+    without a manifest) the output is replaced.
+
+    dedup_capacity: simulate each capacity-equivalence class (same ute * paa and
+    crew inputs, see capacity_sources) once and copy its rows to the other members
+    (written right after the source's rows, see _fan_out).
+
+    shard: (k, n) runs only slice k of n (see shard_mask) into its own dataset under
+    SHARDS_DIR, with its own manifest; merge_shards combines them into OUTPUT_FILE.
+    """
+    if backend == "batch" and ALLOCATION_NOISE:
+        raise ValueError("The batch backend is deterministic; use another backend for ALLOCATION_NOISE > 0")
+    os.makedirs("outputs", exist_ok=True)
+
+    grid_size = int(np.prod(_grid_shape()))
+    fingerprint = _sweep_fingerprint(backend, average_iterations, shard)
+    output = OUTPUT_FILE if shard is None else _shard_path(*shard)
+    manifest_path = os.path.join(output, MANIFEST_NAME)
+    resume = resume and os.path.exists(manifest_path)
+    if resume:
+        manifest = SweepManifest.load(manifest_path, grid_size, fingerprint)
+    else:
+        manifest = SweepManifest(manifest_path, grid_size, fingerprint)
+
+    # Infeasible configs (create_pilots would raise) are dropped before any work
+    feasible, pruned = grid_feasibility()
+    for check, n in pruned.items():
+        print(f"Pruned {n}/{grid_size} configs: {check}")
+    if shard is not None:
+        feasible = shard_mask(feasible, *shard)
+        print(f"Shard {shard[0]}/{shard[1]}: {int(feasible.sum())} configs")
+    total_combos = int(feasible.sum())
+    count = int((feasible & manifest.done).sum())
+    verb = f"Resuming sweep at {count}/{total_combos}" if resume else f"Starting sweep of {total_combos}"
+    print(f"{verb} configs on {workers} worker(s)... Live-writing to {output}")
+
+    # A config whose capacity-equivalent source also runs in this sweep is copied, not simulated
+    todo = feasible & ~manifest.done
+    sources = capacity_sources() if dedup_capacity else np.arange(grid_size)
+    simulate = ~todo | (sources == np.arange(grid_size)) | ~todo[sources]
+    if dedup_capacity:
+        print(f"Reusing {int(np.count_nonzero(~simulate))} capacity-equivalent configs")
+
+    task = partial(_run_chunk, backend=backend, average_iterations=average_iterations, batch_size=batch_size)
+    chunks = (((idx, chunk), chunk) for idx, chunk in _grid_chunks(chunk_size, todo & simulate))
+    columns = sweep_columns(average_iterations)
+    with ParquetSweepWriter(output, sweep_schema(columns), flush_seconds=flush_seconds,
+                            append=resume, manifest=manifest) as writer:
+        telemetry = SweepTelemetry(os.path.join(output, TELEMETRY_NAME), total_combos, workers, done=count, append=resume)
+        for idx, rows, timings in _fan_out(_ordered_results(chunks, task, workers), np.flatnonzero(~simulate), sources):
+            start = time.perf_counter()
+            writer.write_rows(rows, done=idx)
+            busy = timings.pop("busy", 0.0)
+            progress = telemetry.update(len(idx), timings, busy, time.perf_counter() - start)
+            eta = "?" if progress["eta_s"] is None else f"{progress['eta_s'] / 60:.1f} min"
+            print(f"Processed {progress['done']}/{total_combos} configs "
+                  f"({progress['rolling_configs_per_s']:.1f}/s)... ETA {eta}")
+        telemetry.close()
+
+    print(f"Done! Final data available at {output}")
+
+# ----------------------
+# Adaptive Refinement
+# ----------------------
+def _coarse_cells(step: int, axes) -> tuple:
+    """
+    (lo, hi) grid-index corners of the cells between every step-th value of each
+    of axes (the last value always included). Other axes get one flat cell per value.
+    """
+    bounds = []
+    for name, n in zip(SWEEP_GRID, _grid_shape()):
+        if name not in axes:
+            bounds.append(np.stack([np.arange(n), np.arange(n)], axis=1))
+        else:
+            a = np.unique(np.r_[np.arange(0, n, step), n - 1])
+            bounds.append(np.stack([a[:-1], a[1:]], axis=1) if len(a) > 1 else np.array([[0, 0]]))
+    grids = np.meshgrid(*[np.arange(len(b)) for b in bounds], indexing="ij")
+    lo = np.stack([b[g.ravel(), 0] for b, g in zip(bounds, grids)], axis=1)
+    hi = np.stack([b[g.ravel(), 1] for b, g in zip(bounds, grids)], axis=1)
+    return lo, hi
+
+def _cell_corners(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    # Flat grid index of every corner, (cells, 2 ** axes)
+    d = lo.shape[1]
+    bits = ((np.arange(2 ** d)[:, None] >> np.arange(d)) & 1).astype(bool)
+    corners = np.where(bits, hi[:, None, :], lo[:, None, :])
+    return np.ravel_multi_index(corners.reshape(-1, d).T, _grid_shape()).reshape(len(lo), -1)
+
+def _split_cells(lo: np.ndarray, hi: np.ndarray, split: np.ndarray) -> tuple:
+    """
+    Halves every cell along the axes marked in split (cells x axes).
+    """
+    mid = (lo + hi) // 2
+    new_lo, new_hi = [lo[:0]], [hi[:0]]
+    for pattern in np.unique(split, axis=0):
+        sel = (split == pattern).all(axis=1)
+        axes = np.flatnonzero(pattern)
+        for b in range(2 ** len(axes)):
+            upper = np.zeros(lo.shape[1], dtype=bool)
+            upper[axes] = (b >> np.arange(len(axes))) & 1
+            lower = pattern & ~upper
+            new_lo.append(np.where(upper, mid[sel], lo[sel]))
+            new_hi.append(np.where(lower, mid[sel], hi[sel]))
+    return np.concatenate(new_lo), np.concatenate(new_hi)
+
+def run_adaptive_sweep(coarse_step=4, tolerance=None, refine_axes=REFINE_AXES, average_iterations=True,
+                       backend="numba", batch_size=4096, workers=1, chunk_size=1000, block_cells=4096):
+    """
+    Boundary-refinement sweep over SWEEP_GRID: simulates every coarse_step-th value
+    of refine_axes (and every value of the other axes), then repeatedly halves the
+    cells whose corners differ in rap_state_code (infeasible counts as its own code)
+    or, if tolerance is set, by more than tolerance in any of REFINE_METRICS, down
+    to neighbouring grid values. A cell is split only along the axes whose edges
+    show the difference.
+
+    Cells whose corners agree are assumed uniform inside: a boundary that enters
+    and leaves a cell between its corners is missed. Group rates rise with ute, so
+    by default only ute is refined, on RAP code changes only. Checked against the
+    full default grid (exact batch sweep, 1,466,100 feasible configs), the defaults
+    simulate 47.8% of it and every inferred code matches. Refining exp_ratio too
+    (43.4%) gets 1.0% of codes wrong; all of REFINE_AXES with tolerance=0.5 simulates
+    95.2%. A tolerance refines around rate changes as well and simulates more.
+
+    Rows go to ADAPTIVE_OUTPUT_FILE with the sweep columns plus refinement_level,
+    level by level (grid order within a level); refinement_level is 0 for the
+    coarse grid. Each call starts from scratch (no resume).
+    """
     os.makedirs("outputs", exist_ok=True)
-    cols = [
-        "paa", "ute", "total_capacity", "exp_ratio", "ip_qty", "total_pilots", 
-        "mqt_qty", "flug_qty", "ipug_qty", "rap_state_code", "rap_state_label", 
-        "blue_rap_state_code", "blue_rap_state_label", "mqt_monthly", "wg_monthly", 
-        "fl_monthly", "ip_monthly", "wg_blue_monthly", "fl_blue_monthly", 
-        "ip_blue_monthly", "wg_red_monthly", "fl_red_monthly", "ip_red_monthly", 
-        "wg_red_pct", "fl_red_pct", "ip_red_pct"
-    ]
-    pd.DataFrame(columns=cols).to_csv(OUTPUT_FILE, index=False)
-
-    total_combos = len(ute_values) * len(ip_qty_values) * len(exp_ratios) * len(paa_values) * len(mqt_students) * len(flug_students) * len(ipug_students) * len(total_pilots)
-    print(f"Starting sweep of {total_combos} configs... Live-writing to {OUTPUT_FILE}")
-
-    count = 0
-    for paa in paa_values:
-        for ute in ute_values:
-            for ip_q in ip_qty_values:
-                for exp in exp_ratios:
-                    for mqt in mqt_students:
-                        for flug in flug_students:
-                            for ipug in ipug_students:
-                                for total in total_pilots:
-                                    config_results = []
-                                    cfg = SquadronConfig(
-                                        paa=paa, ute=ute, experience_ratio=exp, ip_qty=ip_q,
-                                        mqt_students=mqt, flug_students=flug, ipug_students=ipug,
-                                        phase_length_days=PHASE_DAYS, total_pilots=total
-                                    )
-
-                                    for i in range(ITERATIONS_PER_CONFIG):
-                                        try:
-                                            pilots = create_pilots(cfg)
-                                            final_pilots = run_phase_simulation(cfg, pilots, allocation_noise=0.0)
-                                            rap_dict, blue_rap_dict, red_dict = rap_assess(final_pilots)
-
-                                            r_code = rap_state_code(rap_dict)
-                                            b_code = rap_state_code(blue_rap_dict)
-
-                                            current_result = {
-                                                "paa": paa, "ute": ute, 
-                                                "total_capacity": cfg.paa * cfg.ute * (PHASE_DAYS / 30),
-                                                "exp_ratio": exp, "ip_qty": ip_q, "total_pilots": total,
-                                                "mqt_qty": mqt, "flug_qty": flug, "ipug_qty": ipug,
-                                                "rap_state_code": r_code, "rap_state_label": rap_state_label(r_code),
-                                                "blue_rap_state_code": b_code, "blue_rap_state_label": rap_state_label(b_code),
-                                                "mqt_monthly": rap_dict["MQT"][1], "wg_monthly": rap_dict["WG"][1],
-                                                "fl_monthly": rap_dict["FL"][1], "ip_monthly": rap_dict["IP"][1],
-                                                "wg_blue_monthly": blue_rap_dict["WG"][1], 
-                                                "fl_blue_monthly": blue_rap_dict["FL"][1], 
-                                                "ip_blue_monthly": blue_rap_dict["IP"][1],
-                                                "wg_red_monthly": red_dict["WG"][1], 
-                                                "fl_red_monthly": red_dict["FL"][1], 
-                                                "ip_red_monthly": red_dict["IP"][1], 
-                                                "wg_red_pct": red_dict["WG"][0], 
-                                                "fl_red_pct": red_dict["FL"][0], 
-                                                "ip_red_pct": red_dict["IP"][0]
-                                            }
-                                            config_results.append(current_result)
-                                        except ValueError:
-                                            break
-
-                                    # --- AGGREGATION & WRITE ---
-                                    if config_results:
-                                        if average_iterations:
-                                            temp_df = pd.DataFrame(config_results)
-                                            # Average numbers, flip to row
-                                            final_rows = temp_df.mean(numeric_only=True).to_frame().T
-                                            # Re-label strings
-                                            final_rows["rap_state_label"] = rap_state_label(int(round(final_rows["rap_state_code"].iloc[0])))
-                                            final_rows["blue_rap_state_label"] = rap_state_label(int(round(final_rows["blue_rap_state_code"].iloc[0])))
-                                        else:
-                                            final_rows = pd.DataFrame(config_results)
-
-                                        # Ensure column order matches the CSV header
-                                        final_rows = final_rows.reindex(columns=cols)
-                                        final_rows.to_csv(OUTPUT_FILE, mode='a', header=False, index=False)
-                            
-                                    count += 1
-                                    if count % 100 == 0:
-                                        print(f"Processed {count}/{total_combos} configs...")
-    
-    print(f"Done! Final data available at {OUTPUT_FILE}")
+    grid_size = int(np.prod(_grid_shape()))
+    feasible, _ = grid_feasibility()
+
+    # Per grid point: rap_state_code (-1 infeasible) and REFINE_METRICS, NaN until simulated
+    code = np.full(grid_size, np.nan)
+    metrics = np.full((grid_size, len(REFINE_METRICS)), np.nan)
+    code[~feasible] = -1
+
+    task = partial(_run_chunk, backend=backend, average_iterations=average_iterations, batch_size=batch_size)
+    lo, hi = _coarse_cells(coarse_step, refine_axes)
+    level = 0
+    columns = sweep_columns(average_iterations) + ["refinement_level"]
+    with ParquetSweepWriter(ADAPTIVE_OUTPUT_FILE, sweep_schema(columns), flush_seconds=float("inf")) as writer:
+        while len(lo):
+            todo = np.zeros(grid_size, dtype=bool)
+            for start in range(0, len(lo), block_cells):
+                todo[_cell_corners(lo[start:start + block_cells], hi[start:start + block_cells]).ravel()] = True
+            todo &= np.isnan(code)
+
+            for idx, (config_rows, _) in _ordered_results(_grid_chunks(chunk_size, todo), task, workers):
+                rows = []
+                for i, r in zip(idx, config_rows):
+                    code[i] = r[0]["rap_state_code"] if r else -1
+                    if r:
+                        metrics[i] = [r[0][m] for m in REFINE_METRICS]
+                    rows.extend({**row, "refinement_level": level} for row in r)
+                writer.write_rows(rows)
+
+            # Split each cell only along the axes whose edges (corner pairs one axis apart) differ
+            split = np.zeros(lo.shape, dtype=bool)
+            for start in range(0, len(lo), block_cells):
+                corners = _cell_corners(lo[start:start + block_cells], hi[start:start + block_cells])
+                for k in range(lo.shape[1]):
+                    a = corners[:, (np.arange(corners.shape[1]) >> k) & 1 == 0]
+                    b = corners[:, (np.arange(corners.shape[1]) >> k) & 1 == 1]
+                    differs = (code[a] != code[b]).any(axis=1)
+                    if tolerance is not None:
+                        differs |= (np.abs(metrics[a] - metrics[b]) > tolerance).any(axis=(1, 2))
+                    split[start:start + block_cells, k] = differs
+            split &= hi - lo > 1
+            refine = split.any(axis=1)
+            print(f"Level {level}: {len(lo)} cells, {int(todo.sum())} configs simulated, {int(refine.sum())} cells refined")
+
+            lo, hi = _split_cells(lo[refine], hi[refine], split[refine])
+            level += 1
+
+    simulated = int(np.count_nonzero(~np.isnan(code) & feasible))
+    print(f"Done! Simulated {simulated}/{int(feasible.sum())} feasible configs; data available at {ADAPTIVE_OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    # One call only
-    run_research_sweep(average_iterations=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the research sweep (optionally one shard of it).")
+    parser.add_argument("--spec", help="sweep spec file (.json, .yaml)")
+    parser.add_argument("--shard", help="run slice k/n (0 <= k < n) into its own output")
+    parser.add_argument("--merge", type=int, metavar="N", help="merge the outputs of N finished shards")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args()
+
+    settings = apply_sweep_spec(load_sweep_spec(args.spec)) if args.spec else {}
+    if args.merge is not None:
+        if args.merge < 1:
+            parser.error(f"--merge needs N >= 1, got {args.merge}")
+        merge_shards(args.merge, settings.get("backend", "python"), settings.get("average_iterations", True))
+    else:
+        run_research_sweep(**settings, workers=args.workers, resume=args.resume,
+                           shard=parse_shard(args.shard) if args.shard else None)
\ No newline at end of file
@@ -28,19 +28,8 @@ def _qual_hierarchy_check(pilot_qual: Qual, seat_required: Qual) -> bool:
     Internal helper: Returns True if pilot rank >= seat rank.
     Replaces: qual_meets_requirement
     """
-    # IP can fly everything
-    if pilot_qual == Qual.IP:
-        return True
-    
-    # FL can fly FL and WG seats
-    if pilot_qual == Qual.FL:
-        return seat_required in [Qual.FL, Qual.WG]
-    
-    # WG can only fly WG seats
-    if pilot_qual == Qual.WG:
-        return seat_required == Qual.WG
-        
-    return False
+    # Qual codes run WG < FL < IP: IP flies everything, FL flies FL/WG, WG only WG
+    return pilot_qual.code >= seat_required.code
 
 def can_fill_seat(pilot: Pilot, seat_type: Qual, syllabus_upgrade: Upgrade = None) -> bool:
     """
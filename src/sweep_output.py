@@ -0,0 +1,239 @@
+import os
+import glob
+import json
+import time
+import shutil
+from collections import deque
+from typing import Optional, Dict
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ----------------------
+# Sweep Output Schema
+# ----------------------
+# Grid inputs that are always whole numbers stay int64 (averaging replicates of one
+# config cannot change them); everything that may be averaged is float64.
+_INT_COLUMNS = ["paa", "ip_qty", "total_pilots", "mqt_qty", "flug_qty", "ipug_qty", "refinement_level", "replicates"]
+_STRING_COLUMNS = ["rap_state_label", "blue_rap_state_label"]
+
+def sweep_schema(columns) -> pa.Schema:
+    return pa.schema([
+        (c, pa.int64() if c in _INT_COLUMNS else pa.string() if c in _STRING_COLUMNS else pa.float64())
+        for c in columns
+    ])
+
+# ----------------------
+# Sweep Manifest
+# ----------------------
+MANIFEST_NAME = "_manifest.npz"  # "_" prefix: ignored by Parquet dataset readers
+
+class SweepManifest:
+    """
+    Which grid points (flat index into the sweep grid) have rows in committed
+    output parts, as a bitmap, plus the committed part file names.
+
+    fingerprint identifies the sweep (grid, backend, ...); resuming with a manifest
+    from a different sweep raises ValueError.
+    """
+    def __init__(self, path: str, size: int, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.done = np.zeros(size, dtype=bool)
+        self.parts = []
+
+    @classmethod
+    def load(cls, path: str, size: int, fingerprint: str) -> "SweepManifest":
+        manifest = cls(path, size, fingerprint)
+        with np.load(path) as data:
+            if str(data["fingerprint"]) != fingerprint or int(data["size"]) != size:
+                raise ValueError(f"{path} belongs to a different sweep; start a fresh one instead of resuming")
+            manifest.done = np.unpackbits(data["bits"], count=size).astype(bool)
+            manifest.parts = [str(p) for p in data["parts"]]
+        return manifest
+
+    def commit(self, part: Optional[str], indices: np.ndarray):
+        """
+        Marks indices done and records part (if any), then saves atomically (tmp + rename).
+        """
+        self.done[np.asarray(indices, dtype=np.int64)] = True
+        if part is not None:
+            self.parts.append(part)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, bits=np.packbits(self.done), size=len(self.done),
+                     fingerprint=self.fingerprint, parts=np.array(self.parts, dtype=str))
+        os.replace(tmp, self.path)
+
+# ----------------------
+# Progress Telemetry
+# ----------------------
+TELEMETRY_NAME = "_telemetry.jsonl"  # "_" prefix: ignored by Parquet dataset readers
+
+class SweepTelemetry:
+    """
+    Appends one JSON object per progress update to a JSON-lines file, for progress
+    bars or dashboards to tail:
+
+        done, total, elapsed_s, configs_per_s (since start), rolling_configs_per_s
+        (last window_s seconds), eta_s, stage_s (seconds per stage, summed over
+        workers), worker_utilization (busy worker time / (elapsed * workers))
+
+    Stages are whatever the simulations report ("pilot_creation", "syllabus",
+    "ct", "rap_assess", ...) plus "writing", timed here.
+    """
+    def __init__(self, path: str, total: int, workers: int, done: int = 0,
+                 window_s: float = 60.0, append: bool = False):
+        self.path = path
+        self.total = total
+        self.workers = workers
+        self.done = done
+        self.window_s = window_s
+        self.stage_s = {}
+        self.busy_s = 0.0
+        self._start = time.monotonic()
+        self._start_done = done
+        self._recent = deque([(self._start, done)])
+        self._file = open(path, "a" if append else "w")
+
+    def update(self, configs: int, timings: Dict[str, float], busy_s: float, write_s: float) -> dict:
+        """
+        Records configs finished with their stage timings, worker busy time and
+        the time spent writing them; returns (and logs) the progress record.
+        """
+        now = time.monotonic()
+        self.done += configs
+        self.busy_s += busy_s
+        for stage, seconds in timings.items():
+            self.stage_s[stage] = self.stage_s.get(stage, 0.0) + seconds
+        self.stage_s["writing"] = self.stage_s.get("writing", 0.0) + write_s
+
+        self._recent.append((now, self.done))
+        while len(self._recent) > 2 and now - self._recent[1][0] >= self.window_s:
+            self._recent.popleft()
+        elapsed = now - self._start
+        rate = (self.done - self._start_done) / elapsed if elapsed > 0 else 0.0
+        t0, done0 = self._recent[0]
+        rolling = (self.done - done0) / (now - t0) if now > t0 else rate
+
+        record = {
+            "time": time.time(), "done": self.done, "total": self.total, "elapsed_s": elapsed,
+            "configs_per_s": rate, "rolling_configs_per_s": rolling,
+            "eta_s": (self.total - self.done) / rolling if rolling > 0 else None,
+            "stage_s": self.stage_s,
+            "worker_utilization": self.busy_s / (elapsed * self.workers) if elapsed > 0 else None,
+        }
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        return record
+
+    def close(self):
+        self._file.close()
+
+# ----------------------
+# Streaming Parquet Writer
+# ----------------------
+class ParquetSweepWriter:
+    """
+    Streams sweep rows into a Parquet dataset directory (read it back with
+    pd.read_parquet(path)).
+
+    Rows are buffered column-wise and written as row groups of row_group_size.
+    Every flush_seconds the current part file is closed and a new one started:
+    a Parquet file is only readable once its footer is written, so this keeps the
+    results so far readable during long sweeps. Parts are written under a hidden
+    "_" name and renamed into place when complete, so readers never see a
+    half-written file.
+
+    With a manifest, the grid indices passed to write_rows are committed to it
+    right after each part is renamed into place. On append, parts the manifest
+    does not list (a crash between the two renames) are dropped, so the output and
+    the manifest always agree.
+    """
+    def __init__(self, path: str, schema: pa.Schema, row_group_size: int = 65536,
+                 flush_seconds: float = 300.0, compression: str = "brotli", append: bool = False,
+                 manifest: Optional[SweepManifest] = None):
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.flush_seconds = flush_seconds
+        self.compression = compression
+        self.manifest = manifest
+
+        if not append and os.path.exists(path):
+            # A fresh sweep replaces the previous output (file or dataset directory)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "_part-*.parquet.tmp")):
+            os.remove(stale)  # unfinished part from an interrupted run (never readable)
+
+        parts = sorted(os.path.basename(p) for p in glob.glob(os.path.join(path, "part-*.parquet")))
+        if manifest is not None:
+            for orphan in set(parts) - set(manifest.parts):
+                os.remove(os.path.join(path, orphan))
+            parts = manifest.parts
+        self._part = max((int(p[5:10]) + 1 for p in parts), default=0)
+        self._pending = []  # grid indices written since the last commit
+        self._writer = None
+        self._tmp_path = None
+        self._last_flush = time.monotonic()
+        self._columns = {name: [] for name in schema.names}
+        self._buffered = 0
+
+    def write_rows(self, rows: list, done: Optional[np.ndarray] = None):
+        """
+        Buffers row dicts (missing columns become null) and writes full row groups.
+        done: grid indices these rows complete (committed to the manifest).
+        """
+        if done is not None:
+            self._pending.append(np.asarray(done))
+        for name, values in self._columns.items():
+            values.extend(row.get(name) for row in rows)
+        self._buffered += len(rows)
+
+        while self._buffered >= self.row_group_size:
+            self._write_row_group(self.row_group_size)
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows and closes the current part, making it readable.
+        """
+        if self._buffered:
+            self._write_row_group(self._buffered)
+        part = None
+        if self._writer is not None:
+            self._writer.close()
+            part = f"part-{self._part:05d}.parquet"
+            os.replace(self._tmp_path, os.path.join(self.path, part))
+            self._writer = None
+            self._part += 1
+        # Indices without rows (infeasible configs) are committed even if no part was written
+        if self.manifest is not None and (part or self._pending):
+            self.manifest.commit(part, np.concatenate(self._pending) if self._pending else [])
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write_row_group(self, n: int):
+        if self._writer is None:
+            self._tmp_path = os.path.join(self.path, f"_part-{self._part:05d}.parquet.tmp")
+            self._writer = pq.ParquetWriter(self._tmp_path, self.schema, compression=self.compression)
+
+        batch = {name: values[:n] for name, values in self._columns.items()}
+        self._writer.write_table(pa.Table.from_pydict(batch, schema=self.schema), row_group_size=n)
+        for values in self._columns.values():
+            del values[:n]
+        self._buffered -= n
@@ -0,0 +1,314 @@
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+import numpy as np
+from src.models import SquadronConfig, Pilot, Qual, Upgrade, EventType
+from src.syllabi import ContinuationProfile, CONTINUATION_PROFILE, MQT_SYLLABUS, FLUG_SYLLABUS, IPUG_SYLLABUS
+import time
+from src.engine import pilot_counts, total_phase_capacity, continuation_bucket_quantities, water_fill, add_stage_time, event_matrix
+from src import kernels
+from src.kernels import EVENT_STUDENT, EVENT_INSTRUCTOR, EVENT_BLUE_WG, EVENT_BLUE_FL, EVENT_RED_WG, EVENT_RED_FL
+from src.rap_state import rap_group_entries
+
+# ----------------------
+# Integer Codes
+# ----------------------
+# Quals are ordered so that "pilot code >= seat code" is the seat hierarchy check
+# (the same codes as the Qual / Upgrade enums in models.py)
+WG, FL, IP = Qual.WG.code, Qual.FL.code, Qual.IP.code
+NONE, MQT, FLUG, IPUG = Upgrade.NONE.code, Upgrade.MQT.code, Upgrade.FLUG.code, Upgrade.IPUG.code
+
+QUAL_CODES = {Qual.WG: WG, Qual.FL: FL, Qual.IP: IP}
+UPGRADE_CODES = {Upgrade.NONE: NONE, Upgrade.MQT: MQT, Upgrade.FLUG: FLUG, Upgrade.IPUG: IPUG}
+
+# ----------------------
+# Squadron State (Struct of Arrays)
+# ----------------------
+@dataclass
+class PhaseArrays:
+    """
+    One squadron's pilots held as parallel arrays (row i is pilot i).
+    Counters are integers; monthly rates are filled in by finalize_phase.
+    """
+    qual: np.ndarray
+    upgrade: np.ndarray
+    sortie: np.ndarray
+    blue: np.ndarray
+    red: np.ndarray
+    sim: np.ndarray
+    total: Optional[np.ndarray] = None
+    sortie_monthly: Optional[np.ndarray] = None
+    sim_monthly: Optional[np.ndarray] = None
+    blue_monthly: Optional[np.ndarray] = None
+    red_monthly: Optional[np.ndarray] = None
+
+    @classmethod
+    def empty(cls, qual: np.ndarray, upgrade: Optional[np.ndarray] = None) -> 'PhaseArrays':
+        n = len(qual)
+        if upgrade is None:
+            upgrade = np.zeros(n, dtype=np.int8)
+        return cls(
+            qual=np.asarray(qual, dtype=np.int8),
+            upgrade=np.asarray(upgrade, dtype=np.int8),
+            sortie=np.zeros(n, dtype=np.int64),
+            blue=np.zeros(n, dtype=np.int64),
+            red=np.zeros(n, dtype=np.int64),
+            sim=np.zeros(n, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_config(cls, cfg: SquadronConfig) -> 'PhaseArrays':
+        """
+        Array equivalent of engine.create_pilots (same ordering and validation).
+        """
+        wg_count, fl_count, ip_count = pilot_counts(cfg)
+        qual = np.repeat(np.array([WG, FL, IP], dtype=np.int8), [wg_count, fl_count, ip_count])
+        return cls.empty(qual)
+
+    @classmethod
+    def from_pilots(cls, pilots: List[Pilot]) -> 'PhaseArrays':
+        return cls.empty(
+            np.array([QUAL_CODES[p.qual] for p in pilots], dtype=np.int8),
+            np.array([UPGRADE_CODES[p.upgrade] for p in pilots], dtype=np.int8),
+        )
+
+    def __len__(self) -> int:
+        return len(self.qual)
+
+# ----------------------
+# Vectorized Rules
+# ----------------------
+def can_start_upgrade_mask(state: PhaseArrays, upgrade_code: int) -> np.ndarray:
+    """
+    Array version of rules.can_start_upgrade.
+    """
+    student_qual = FL if upgrade_code == IPUG else WG
+    return (state.upgrade == NONE) & (state.qual == student_qual)
+
+def can_fill_seat_mask(state: PhaseArrays, seat_code: int, syllabus_code: Optional[int] = None) -> np.ndarray:
+    """
+    Array version of rules.can_fill_seat (syllabus_code=None is CT).
+    """
+    mask = state.qual >= seat_code
+
+    # Upgrade lock-in rules
+    if syllabus_code != MQT:
+        mask &= state.upgrade != MQT
+    if syllabus_code not in (FLUG, None):
+        mask &= state.upgrade != FLUG
+    if syllabus_code not in (IPUG, None):
+        mask &= state.upgrade != IPUG
+    return mask
+
+# ----------------------
+# Pool Allocation
+# ----------------------
+def _fill_pool(state: PhaseArrays, pool: np.ndarray, qty: int, is_red: bool, noise: float, rng: np.random.Generator, tie_break: str):
+    if qty <= 0 or len(pool) == 0:
+        return
+
+    if noise > 0:
+        # No closed form with noise: draw one sortie at a time like assign_sortie
+        inc = np.zeros(len(pool), dtype=np.int64)
+        counts = state.sortie[pool].copy()
+        for _ in range(qty):
+            winner = np.argmin(counts + rng.uniform(0, noise, len(pool)))
+            counts[winner] += 1
+            inc[winner] += 1
+    else:
+        inc = water_fill(state.sortie[pool], qty, tie_break)
+
+    state.sortie[pool] += inc
+    if is_red:
+        state.red[pool] += inc
+    else:
+        state.blue[pool] += inc
+
+def _pick_noisy(counter: np.ndarray, pool: np.ndarray, exclude: int, noise: float, rng: np.random.Generator) -> int:
+    # kernels._pick with a uniform(0, noise) draw added to every candidate's count
+    if len(pool) == 0 or (len(pool) == 1 and pool[0] == exclude):
+        return -1
+    keys = counter[pool] + rng.uniform(0, noise, len(pool))
+    keys[pool == exclude] = np.inf
+    return int(pool[np.argmin(keys)])
+
+def _program_noisy(counter, blue, red, students, events, ip_pool, fl_pool, wg_pool, noise, rng):
+    # kernels.program_kernel seat by seat, with noisy picks
+    seats = ((EVENT_INSTRUCTOR, ip_pool, False, False), (EVENT_BLUE_WG, wg_pool, False, True),
+             (EVENT_BLUE_FL, fl_pool, False, True), (EVENT_RED_WG, wg_pool, True, True),
+             (EVENT_RED_FL, fl_pool, True, True))
+    for event in events:
+        for student in students:
+            for _ in range(event[EVENT_STUDENT]):
+                counter[student] += 1
+                blue[student] += 1
+                for column, pool, is_red, support in seats:
+                    for _ in range(event[column]):
+                        i = _pick_noisy(counter, pool, student if support else -1, noise, rng)
+                        if i >= 0:
+                            counter[i] += 1
+                            (red if is_red else blue)[i] += 1
+
+# ----------------------
+# Phase Steps
+# ----------------------
+def select_upgrade_students(state: PhaseArrays, upgrade_code: int, count: int) -> np.ndarray:
+    """
+    Marks the first 'count' eligible pilots as students; returns their indices.
+    """
+    selected = np.flatnonzero(can_start_upgrade_mask(state, upgrade_code))[:count]
+    state.upgrade[selected] = upgrade_code
+    return selected
+
+# Per-event seat matrix of each syllabus (engine.event_matrix) and which rows are SIM events
+PROGRAM_EVENTS = {
+    code: (event_matrix(syllabus), np.array([e.event_type == EventType.SIM for e in syllabus], dtype=bool))
+    for code, syllabus in ((MQT, MQT_SYLLABUS), (FLUG, FLUG_SYLLABUS), (IPUG, IPUG_SYLLABUS))
+}
+
+def run_upgrade_program(state: PhaseArrays, students: np.ndarray, upgrade_code: int, noise: float, rng: np.random.Generator, count_sims: bool = False):
+    """
+    Runs an upgrade program event by event, student by student, through
+    kernels.program_kernel: every instructor and support seat goes to the
+    least-flown eligible pilot (earliest in the squadron on ties) and students
+    never fill their own support seats. With zero noise the per-pilot counts are
+    identical to engine.run_upgrade_program; with noise each seat adds a fresh
+    uniform(0, noise) draw to the candidates' counts.
+
+    By default SIM events are flown as sorties, like the Python path. With
+    count_sims=True only SORTIE events use aircraft, and SIM events fill seats
+    the same way on the sim counts (least-simmed pilot first).
+    """
+    if len(students) == 0:
+        return
+
+    events, is_sim = PROGRAM_EVENTS[upgrade_code]
+    pools = [np.flatnonzero(can_fill_seat_mask(state, seat, upgrade_code)) for seat in (IP, FL, WG)]
+    students = np.asarray(students, dtype=np.int64)
+
+    if count_sims:
+        # Sims have no side, so Blue/Red land in scratch arrays
+        scratch = np.zeros(len(state), dtype=np.int64)
+        _run_events(state.sim, scratch, scratch.copy(), students, events[is_sim], pools, noise, rng)
+        events = events[~is_sim]
+    _run_events(state.sortie, state.blue, state.red, students, events, pools, noise, rng)
+
+def _run_events(counter, blue, red, students, events, pools, noise, rng):
+    ip_pool, fl_pool, wg_pool = pools
+    if noise > 0:
+        _program_noisy(counter, blue, red, students, events, ip_pool, fl_pool, wg_pool, noise, rng)
+    else:
+        hours = np.zeros(len(counter))  # PhaseArrays keep no hours
+        kernels.program_kernel(counter, blue, red, hours, students, events, ip_pool, fl_pool, wg_pool, 0.0)
+
+def allocate_continuation_training(state: PhaseArrays, profile: ContinuationProfile, total_capacity: int, noise: float, rng: np.random.Generator):
+    """
+    Array version of engine.allocate_continuation_training (exact for zero noise).
+    """
+    remaining_capacity = max(0, total_capacity - int(state.sortie.sum()))
+    if remaining_capacity <= 0:
+        return
+
+    ct_mask = state.upgrade != MQT
+    if not ct_mask.any():
+        return
+
+    base_qty = continuation_bucket_quantities(profile, remaining_capacity)
+
+    for bucket, qty in base_qty.items():
+        pool = np.flatnonzero(ct_mask & (state.qual >= QUAL_CODES[bucket.min_qual]))
+        _fill_pool(state, pool, qty, bucket.side == "Red", noise, rng, "recent")
+
+def finalize_phase(state: PhaseArrays, phase_length_days: int):
+    """
+    Array version of Pilot.update_total / Pilot.update_monthly.
+    """
+    state.total = state.sortie + state.sim
+    months = phase_length_days / 30
+    if months > 0:
+        state.sortie_monthly = state.sortie / months
+        state.sim_monthly = state.sim / months
+        state.blue_monthly = state.blue / months
+        state.red_monthly = state.red / months
+    else:
+        n = len(state)
+        state.sortie_monthly = np.zeros(n)
+        state.sim_monthly = np.zeros(n)
+        state.blue_monthly = np.zeros(n)
+        state.red_monthly = np.zeros(n)
+
+# ----------------------
+# Main Simulation Phase
+# ----------------------
+def run_phase_simulation(cfg: SquadronConfig, allocation_noise: float = 0.0, seed: Optional[int] = None, count_sims: bool = False,
+                         timings: Optional[Dict[str, float]] = None) -> PhaseArrays:
+    """
+    NumPy backend for engine.run_phase_simulation. Builds the squadron from cfg
+    (same validation as create_pilots) and returns the finalized arrays.
+
+    count_sims=True counts syllabus SIM events as sims (see run_upgrade_program)
+    instead of the flat 3 sims per month, as in engine.run_phase_simulation.
+
+    timings: optional dict that seconds per stage ("pilot_creation", "syllabus",
+    "ct", "finalize") are added to.
+    """
+    start = time.perf_counter()
+    state = PhaseArrays.from_config(cfg)
+    rng = np.random.default_rng(seed)
+    start = add_stage_time(timings, "pilot_creation", start)
+
+    mqt_students = select_upgrade_students(state, MQT, cfg.mqt_students)
+    flug_students = select_upgrade_students(state, FLUG, cfg.flug_students)
+    ipug_students = select_upgrade_students(state, IPUG, cfg.ipug_students)
+
+    run_upgrade_program(state, mqt_students, MQT, allocation_noise, rng, count_sims)
+    run_upgrade_program(state, flug_students, FLUG, allocation_noise, rng, count_sims)
+    run_upgrade_program(state, ipug_students, IPUG, allocation_noise, rng, count_sims)
+    start = add_stage_time(timings, "syllabus", start)
+
+    phase_months = cfg.phase_length_days / 30.0
+    total_capacity = int(total_phase_capacity(cfg) * phase_months)
+    allocate_continuation_training(state, CONTINUATION_PROFILE, total_capacity, allocation_noise, rng)
+    start = add_stage_time(timings, "ct", start)
+
+    if not count_sims:
+        state.sim[:] = 3 * phase_months
+    finalize_phase(state, cfg.phase_length_days)
+    add_stage_time(timings, "finalize", start)
+    return state
+
+# ----------------------
+# Reporting
+# ----------------------
+def rap_assess(state: PhaseArrays):
+    """
+    Array version of rap_state.rap_assess; returns the same three dicts.
+    """
+    groups = {
+        "MQT": state.upgrade == MQT,
+        "WG": (state.qual == WG) & (state.upgrade != MQT),
+        "FL": state.qual == FL,
+        "IP": state.qual == IP,
+    }
+
+    rap_dict = {}
+    blue_rap_dict = {}
+    red_dict = {}
+
+    for group_name, mask in groups.items():
+        size = int(mask.sum())
+        if size == 0:
+            rap_dict[group_name] = [0, 0]
+            blue_rap_dict[group_name] = [0, 0]
+            red_dict[group_name] = [0, 0]
+            continue
+
+        # Summed in pilot order like rap_state.rap_assess (np.sum is pairwise)
+        avg_sorties = float(np.cumsum(state.sortie_monthly[mask])[-1]) / size
+        avg_blue_sorties = float(np.cumsum(state.blue_monthly[mask])[-1]) / size
+        avg_red_sorties = float(np.cumsum(state.red_monthly[mask])[-1]) / size
+
+        rap_dict[group_name], blue_rap_dict[group_name], red_dict[group_name] = rap_group_entries(
+            group_name, avg_sorties, avg_blue_sorties, avg_red_sorties
+        )
+
+    return rap_dict, blue_rap_dict, red_dict
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
 import joblib
+from src.rate_cache import BRAIN_VERSION
 
 # 1. LOAD DATA
 path = "outputs/simulation_results.parquet" # Ensure this path is correct
@@ -18,27 +20,47 @@ targets = [
     'wg_monthly', 'fl_monthly', 'ip_monthly', 
     'wg_blue_monthly', 'fl_blue_monthly', 'ip_blue_monthly'
 ]
-models = {}
+# True: one forest predicting all six targets (brain version BRAIN_VERSION, one
+# pass per prediction). False: the original six single-target forests.
+MULTI_OUTPUT = True
+
+# ⚡ OPTIMIZATION SETTINGS ⚡
+# n_estimators: 100 -> 20 (5x faster, 5x smaller)
+# max_depth: 15 -> 10 (Prevents storing massive tree branches)
+# n_jobs=-1: Uses all CPU cores
+rf_settings = dict(n_estimators=20, max_depth=10, n_jobs=-1, random_state=42)
 
 print("🧠 Training Lite Models...")
-for target in targets:
-    # Filter clean data
-    clean_df = df[df[target] >= 0.0] 
+if MULTI_OUTPUT:
+    # Filter clean data: rates are never negative, so the >= 0.0 filter only drops NaNs
+    clean_df = df.dropna(subset=targets)
     X = clean_df[features]
-    y = clean_df[target]
-    
-    # ⚡ OPTIMIZATION SETTINGS ⚡
-    # n_estimators: 100 -> 20 (5x faster, 5x smaller)
-    # max_depth: 15 -> 10 (Prevents storing massive tree branches)
-    # n_jobs=-1: Uses all CPU cores
-    model = RandomForestRegressor(n_estimators=20, max_depth=10, n_jobs=-1, random_state=42)
+    y = clean_df[targets]
+
+    model = RandomForestRegressor(**rf_settings)
     model.fit(X, y)
-    
-    models[target] = model
-    print(f"   - {target} Score: {model.score(X, y):.4f}")
+
+    pred = model.predict(X)
+    for k, target in enumerate(targets):
+        print(f"   - {target} Score: {r2_score(y[target], pred[:, k]):.4f}")
+    brain = {"version": BRAIN_VERSION, "features": features, "targets": targets, "model": model}
+else:
+    models = {}
+    for target in targets:
+        # Filter clean data
+        clean_df = df[df[target] >= 0.0] 
+        X = clean_df[features]
+        y = clean_df[target]
+        
+        model = RandomForestRegressor(**rf_settings)
+        model.fit(X, y)
+        
+        models[target] = model
+        print(f"   - {target} Score: {model.score(X, y):.4f}")
+    brain = models
 
 # 3. SAVE WITH COMPRESSION
 filename = "sortie_brain.pkl"
 # compress=3 drastically reduces file size
-joblib.dump(models, filename, compress=3) 
+joblib.dump(brain, filename, compress=3) 
 print(f"\n✅ Lite Brain saved to {filename}")
\ No newline at end of file